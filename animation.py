@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+"""
+Playback of animated GIFs and multi-page TIFFs for the SlideShow4RaspberryPi
+project
+"""
+
+
+import queue
+import threading
+
+from PIL import Image
+
+import helper_func as hf
+
+
+# Formats that may hold more than one frame
+ANIMATED_FORMATS = frozenset(['gif', 'tif', 'tiff', 'png', 'webp'])
+
+# Browsers show GIF frames of less than 20 ms for 100 ms, as many GIFs on the
+# web rely on it
+MIN_FRAME_DURATION = 0.02
+SHORT_FRAME_DURATION = 0.1
+
+
+def may_be_animated(path):
+    """Returns whether an image may have several frames, judging by its
+    filename only.
+
+    :param path: The path to the image
+    :type path: str
+
+    :rtype: bool
+    """
+
+    return path.rpartition('.')[2].lower() in ANIMATED_FORMATS
+
+
+class FrameStream:
+    """Decodes the frames of an animated image one after another on a
+    background thread.
+
+    Only a few decoded frames are held at any time, so even long animations
+    take little memory and showing them never blocks the main thread. Frames
+    are scaled and turned like still images, see helper_func.decode_img.
+
+    Frames keep their own duration. Frames without one, such as the pages of
+    a TIFF, share the slot evenly. The animation loops until the stream is
+    stopped.
+
+    :param path: The path to the image
+    :type path: str
+    :param slot: Seconds the image is shown for, defaults to 10
+    :type slot: float
+    :param resolution: The size the image is displayed at, defaults to None
+                       meaning native resolution
+    :type resolution: (int, int) or None
+    :param orientation: The exif orientation of the image, defaults to
+                        helper_func.DEFAULT_ORIENTATION
+    :type orientation: int
+    :param frame_orientation: 'landscape' or 'portrait', defaults to
+                              'landscape'
+    :type frame_orientation: str
+    :param buffer: Number of frames decoded ahead, defaults to 4
+    :type buffer: int
+    """
+
+    def __init__(self, path, slot=10, resolution=None,
+                 orientation=hf.DEFAULT_ORIENTATION,
+                 frame_orientation='landscape', buffer=4):
+        """Constructor method
+        """
+
+        self.path = path
+        self.slot = slot
+        self.resolution = resolution
+        self.orientation = orientation
+        self.frame_orientation = frame_orientation
+
+        # Set once it is clear that there is nothing (more) to show
+        self.finished = False
+        self._frames = queue.Queue(maxsize=max(buffer, 1))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts decoding in a background thread.
+        """
+
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='frames')
+        self._thread.start()
+
+    def stop(self):
+        """Stops decoding and drops the frames decoded so far.
+
+        Does not wait for the background thread, which ends after the frame
+        it is decoding.
+        """
+
+        self._stop.set()
+        self.finished = True
+        while True:
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                return
+
+    def get(self):
+        """Returns the next frame if it is decoded already.
+
+        :return: The pixel data, its size, its colour format and the seconds
+                 it is shown for, or None if the frame is not ready
+        :rtype: (bytes, (int, int), str, float) or None
+        """
+
+        try:
+            return self._frames.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        try:
+            self._decode()
+        except Exception as e:
+            print("Could not play {}: {}".format(self.path, e))
+        finally:
+            self.finished = True
+
+    def _decode(self):
+        ops = hf.orientation_ops(self.orientation, self.frame_orientation)
+        with Image.open(self.path) as img:
+            if not getattr(img, 'is_animated', False):
+                return
+
+            resolution = self.resolution
+            if resolution is not None and hf.swaps_axes(ops):
+                resolution = resolution[::-1]
+            pages = getattr(img, 'n_frames', 1) if img.format == 'TIFF' else 0
+            page_duration = self.slot / pages if pages else None
+
+            mode = None
+            index = 0
+            while not self._stop.is_set():
+                try:
+                    img.seek(index)
+                except EOFError:
+                    # Loops back to the first frame
+                    index = 0
+                    continue
+
+                duration = img.info.get('duration')
+                if duration is None:
+                    duration = page_duration or SHORT_FRAME_DURATION
+                else:
+                    duration /= 1000
+                    if duration < MIN_FRAME_DURATION:
+                        duration = SHORT_FRAME_DURATION
+
+                # Pages of a TIFF may differ in size
+                target = None
+                if resolution is not None:
+                    target = hf.fit_size(img.size, resolution)
+                # All frames share the colour format of the first one, so
+                # they fit the same texture
+                pixels, size, colorfmt = hf.render_img(img, ops, target,
+                                                       mode=mode)
+                mode = colorfmt.upper()
+                self._put((pixels, size, colorfmt, duration))
+                index += 1
+
+    def _put(self, frame):
+        while not self._stop.is_set():
+            try:
+                self._frames.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                pass
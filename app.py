@@ -1,48 +1,51 @@
 #!/usr/bin/env python
 
+from collections import deque
 import os
 os.environ['KIVY_NO_ARGS'] = '1'
 from os.path import join, isdir
 import random
 import re
+import threading
+import time
 
+from archive import ArchiveFile, is_archive
 import helper_func as hf
-import configparser as cp
+from config import *
+from decoders import DecoderChoice
+from dedup import DedupIndex
+from failures import FailureRegistry, UnreadableImage, decoding
+from animation import FrameStream, may_be_animated
+from cache import DiskCache, MemoryCache
+from metadata import MetadataIndex
+from metrics import Metrics, MetricsLog, MetricsServer, format_overlay
+from pack import PackFile, is_pack
+from playlist import Playlist
+from power import IdleGovernor, in_period, set_backlight
+from prefetch import Prefetcher
+from resume import PlaybackState
+from watcher import DirectoryWatcher
 
 import kivy
 kivy.require('2.0.0')
 
+from kivy.animation import Animation
 from kivy.app import App
-from kivy.clock import Clock
+from kivy.clock import Clock, mainthread
 from kivy.core.window import Window
 from kivy.factory import Factory
-from kivy.properties import (BooleanProperty, NumericProperty, ObjectProperty,
-StringProperty)
+from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.properties import (BooleanProperty, ListProperty, NumericProperty,
+ObjectProperty, StringProperty)
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.image import Image
+from kivy.uix.label import Label
 from kivy.uix.popup import Popup
 from kivy.uix.textinput import TextInput
 from kivy.uix.togglebutton import ToggleButton
 
-# Automagically sets image to maximum resolution and Window to fullscreen
-Window.fullscreen = 'auto'
-CONFIGFILE = 'settings.conf'
-
-
-CONFIG = cp.ConfigParser()
-CONFIG.read(CONFIGFILE)
-
-# Configuration
-FRAME_ORIENTATION = CONFIG['SLIDESHOW']['frame_orientation']
-
-if isdir(CONFIG['SLIDESHOW']['img_dir']):
-    IMG_DIR = CONFIG['SLIDESHOW']['img_dir']
-else:
-    IMG_DIR = os.getcwd()
-
-TIME_DELAY = CONFIG['SLIDESHOW']['time_delay']
-
 
 class RootWidget(BoxLayout):
     """RootWidget is the base Widget of this application.
@@ -62,6 +65,8 @@ class RootWidget(BoxLayout):
                          frame_orientation=FRAME_ORIENTATION)
 
         if menu_start:
+            self.picture.stop()
+            self.picture.power.busy('menu')
             self.add_widget(self.menu)
         else:
             self.add_widget(self.picture)
@@ -81,26 +86,87 @@ class Picture(Image):
     """Key class extending the existing kivy.uix.image Image class to be used
     in the slide show.
     
-    :param angle: The angle of image rotation in relation to the image's exif
-                  orientation
-    :type angle: int
-    :param imgs: A list of all paths to relevant image files in the chosen
-    image directory
-    :type imgs: list
+    :param animation: Decodes the frames of the animated image shown, None
+        for still images
+    :type animation: animation.FrameStream or None
+    :param animation_event: The scheduled switch to the next frame
+    :type animation_event: None or kivy.clock.ClockEvent
+    :param animation_texture: The texture the frames are drawn into
+    :type animation_texture: None or kivy.graphics.texture.Texture
+    :param blanked: Whether the display is blanked for the night
+    :type blanked: bool
+    :param change_event: The scheduled image switch, None while stopped
+    :type change_event: None or kivy.clock.ClockEvent
+    :param deadline: time.monotonic() at which the next image is due
+    :type deadline: float
+    :param back: How many images the one shown lies behind the newest in
+        history, after swiping back
+    :type back: int
+    :param disk_cache: Display-sized copies of already decoded images, None
+        if disabled
+    :type disk_cache: cache.DiskCache or None
+    :param memory_cache: Textures of recently shown images, keyed by path
+    :type memory_cache: cache.MemoryCache
+    :param history: Recently shown images, oldest first
+    :type history: collections.deque
+    :param metadata: Exif orientation, size and date of all images
+    :type metadata: metadata.MetadataIndex
+    :param metrics: Timings of scanning, decoding, uploading and transitions
+    :type metrics: metrics.Metrics
+    :param overlay: Shows the metrics on screen, None while hidden
+    :type overlay: None or kivy.uix.label.Label
+    :param path: The path to the currently shown image
+    :type path: str
+    :param previous: The image shown by swiping back, None if there is none
+    :type previous: str or None
+    :param power: Lowers the frame rate while nothing moves
+    :type power: power.IdleGovernor
+    :param playlist: All images in the chosen image directory and the order
+        they are shown in
+    :type playlist: playlist.Playlist
+    :param prefetcher: Decodes the neighbouring images in the background
+    :type prefetcher: prefetch.Prefetcher
+    :param resolution: The window size images are decoded for
+    :type resolution: (int, int)
+    :param scan_id: Identifies the latest scan of the image directory
+    :type scan_id: int
     :param scheduled_event: Shows whether an event is scheduled in kivy or not
     :type scheduled_event: None or kivy.clock.ClockEvent
-    :param source: The path to the currently chosen image
-    :type source: str
+    :param container: Provides the images if img_dir is not a directory, None
+        otherwise
+    :type container: pack.PackFile, archive.ArchiveFile or None
+    :param textures: Already uploaded textures of the upcoming and the
+        previous image, keyed by path
+    :type textures: dict
     :param time_delay: The time in seconds until the image shown is switched
     :type time_delay: int
+    :param upcoming: Paths of the images to be shown next, in order
+    :type upcoming: list
+    :param watcher: Reports images added to or removed from the directory,
+        None for other sources
+    :type watcher: watcher.DirectoryWatcher or None
     :param __frame_orientation: Defines if the screen is in 'landscape'
         or 'portrait' orientation, defaults to 'landscape'
     :type __frame_orientation: str
     """
 
-    # Without this declaration, the value will not arrive in kv file
-    # called as self.angle in the code below
-    angle = NumericProperty(0)
+    # The transitions only change these values, the images themselves are
+    # moved and blended on the GPU by the instructions in slideshow.kv
+    # Runs from 0 to 1 during a transition
+    progress = NumericProperty(1)
+    alpha = NumericProperty(1)
+    offset_x = NumericProperty(0)
+    offset_y = NumericProperty(0)
+    zoom = NumericProperty(1)
+    pan = ListProperty([0, 0])
+    # The image shown before, kept on screen during the transition
+    prev_texture = ObjectProperty(None, allownone=True)
+    prev_size = ListProperty([0, 0])
+    prev_alpha = NumericProperty(0)
+    prev_offset_x = NumericProperty(0)
+    prev_offset_y = NumericProperty(0)
+    prev_zoom = NumericProperty(1)
+    prev_pan = ListProperty([0, 0])
 
     def __init__(self, img_dir, time_delay, frame_orientation, *args, **kwargs):
         """Constructor method
@@ -109,6 +175,9 @@ class Picture(Image):
         super(Picture, self).__init__(*args, **kwargs)
 
         self.scheduled_event = None
+        self.power = IdleGovernor(Clock, IDLE_FPS)
+        self.wake_event = None
+        self.touch_event = None
 
         self._img_dir = img_dir
         # Defines how much time passes between image switch
@@ -117,23 +186,1085 @@ class Picture(Image):
         # Defines if the screen sits in landscape or portrait
         self.__frame_orientation = frame_orientation
 
-        # Defines the initial starting image
-        self.imgs = hf.list_img_paths(self.img_dir)
-        self.source = random.choice(self.imgs)
-        self.set_angle()
+        # Images are decoded in the background ahead of being shown, so
+        # that switching only swaps an already uploaded texture
+        self.path = ''
+        # The position in the playlist is stored every minute, once the
+        # state of the previous run was taken over
+        self.state = PlaybackState(STATE_FILE, LIBRARY_FILE)
+        self.saved_at = None
+        self.resumed = False
+        self.resolution = tuple(Window.size)
+        Window.bind(size=self.on_window_size)
+        self.textures = {}
+        self.upcoming = []
+        self.previous = None
+        # Swiping back walks through the history, swiping or switching
+        # forward again walks back to its end before the playlist moves on
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.back = 0
+        self.disk_cache = None
+        if DECODE_MODE == 'display' and DISK_CACHE_MB > 0:
+            self.disk_cache = DiskCache(IMAGE_CACHE_DIR, DISK_CACHE_MB)
+        self.memory_cache = MemoryCache(MEMORY_CACHE_MB, MIN_AVAILABLE_MB)
+        self.decoders = DecoderChoice(
+            DECODER_FILE, forced=None if DECODER == 'auto' else DECODER)
+        # Whether the decoders were chosen for the current resolution
+        self.decoders_chosen = self.decoders.load(self.decode_resolution)
+
+        self.metrics = Metrics()
+        self.metrics.provide('fps', lambda: round(Clock.get_fps(), 1))
+        self.metrics.provide('images', lambda: len(self.playlist))
+        self.metrics.provide('memory_cache', self.memory_cache.stats)
+        if self.disk_cache is not None:
+            self.metrics.provide('disk_cache', self.disk_cache.stats)
+        self.overlay = None
+        self.overlay_event = None
+        self._transition_start = None
+        self._last_progress = None
+        self.prefetcher = Prefetcher(self.load_image,
+                                     on_ready=self.upload_image,
+                                     workers=DECODE_WORKERS,
+                                     on_error=self.image_failed)
+
+        # Images that could not be read are skipped until they change
+        self.failures = FailureRegistry(INDEX_FILE)
+        self.metadata = MetadataIndex(INDEX_FILE,
+                                      on_error=self.image_failed)
+        self.metrics.provide('failed_images', lambda: len(self.failures))
+        self.dedup = DedupIndex(INDEX_FILE) if DEDUP else None
+        # Duplicate -> image shown in its place
+        self.duplicates = {}
+        self.playlist = Playlist(PLAYLIST_ORDER, weight=self.recency_weight)
+        self.container = None
+        # Thread scanning the image directory in the background
+        self.scanner = None
+        self.watcher = None
+        self.animation = None
+        self.animation_event = None
+        self.animation_texture = None
+        # Increased with every scan, so a scan of a previous image
+        # directory still running does not add its images
+        self.scan_id = 0
+        self.load_library()
 
         # Switches the image displayed after duration of
         # self.timedelay in seconds
-        Clock.schedule_interval(self.change_image, self.time_delay)
+        self.change_event = None
+        self.deadline = time.monotonic()
+        self.start()
+
+        self.blanked = False
+        # Until then a tap keeps the display on during the night
+        self.woken_until = 0
+        if NIGHT is not None:
+            self.check_night()
+            Clock.schedule_interval(self.check_night, 30)
+
+    def start(self):
+        """Starts switching images every time_delay seconds.
+        """
+
+        if self.change_event is None:
+            self.schedule_next(time.monotonic())
+
+    def schedule_next(self, shown_at):
+        """Sets the deadline of the next image time_delay seconds after the
+        current one was shown.
+
+        :param shown_at: time.monotonic() at which the current image was
+                         shown, or was due if it was on time
+        :type shown_at: float
+        """
+
+        self.deadline = shown_at + self.time_delay
+        if self.change_event is not None:
+            self.change_event.cancel()
+        self.change_event = Clock.schedule_once(
+            self.on_deadline, max(self.deadline - time.monotonic(), 0))
+
+        # Runs at full frame rate shortly before the deadline, so the slide
+        # is not held back by an idle tick
+        if self.wake_event is not None:
+            self.wake_event.cancel()
+        self.wake_event = Clock.schedule_once(
+            lambda dt: self.power.busy('slide'),
+            max(self.deadline - self.power.lead - time.monotonic(), 0))
+
+    def on_deadline(self, *args):
+        """Shows the next image when it is due.
+
+        Decoding of the next images starts as soon as the current one is
+        shown, see prefetch, so there usually is a whole time_delay to
+        prepare them. Deadlines are kept on a monotonic clock and the next
+        one counts from when the image was due, not from when this ran, so
+        slides do not drift.
+
+        If the next image is not uploaded yet, LATE_SLIDE decides: 'wait'
+        keeps the current image until it is ready, 'skip' shows the first
+        upcoming image that is ready instead. After waiting a whole
+        time_delay, the image is decoded on the spot. An image shown late
+        starts a new series of deadlines, so it is shown for its full time,
+        and the miss is logged.
+
+        NOTE: *args added to fit with Clock.schedule_once call
+        """
+
+        now = time.monotonic()
+        if now < self.deadline:
+            # kivy's clock may fire events a frame early, which would cut
+            # the current slide short
+            self.change_event = Clock.schedule_once(self.on_deadline,
+                                                    self.deadline - now)
+            return
+        upcoming = self.coming_up(max(PREFETCH_DEPTH, 1))
+        if not upcoming:
+            # No images yet, tries again later
+            self.schedule_next(now)
+            return
+
+        late = now - self.deadline
+        if not self.is_ready(upcoming[0]):
+            ready = [p for p in upcoming[1:]
+                     if p != self.path and self.is_ready(p)]
+            if LATE_SLIDE == 'skip' and ready and not self.back:
+                self.playlist.move_up(ready[0])
+                self.metrics.count('skipped_ahead')
+            elif late < self.time_delay:
+                # Keeps the current image a little longer
+                self.change_event = Clock.schedule_once(self.on_deadline,
+                                                        1 / 30)
+                return
+
+        self.metrics.record('lateness', max(late, 0))
+        self.change_image()
+        self.power.idle('slide')
+        if late > LATE_TOLERANCE:
+            self.metrics.count('deadline_misses')
+            print("{} was shown {:.0f} ms late. A higher prefetch_depth or "
+                  "decode_workers may help.".format(self.path, late * 1000))
+            self.schedule_next(now)
+        else:
+            self.schedule_next(self.deadline)
+
+    def is_ready(self, path):
+        """Returns whether an image can be shown without decoding it.
+
+        :param path: The path to the image
+        :type path: str
+
+        :rtype: bool
+        """
+
+        return path in self.textures or path in self.memory_cache
+
+    def stop(self):
+        """Stops switching images, e.g. while the menu is open.
+        """
+
+        if self.change_event is not None:
+            self.change_event.cancel()
+            self.change_event = None
+        if self.wake_event is not None:
+            self.wake_event.cancel()
+            self.wake_event = None
+        self.power.idle('slide')
+        # Finishes a running transition at once and halts the Ken Burns
+        # movement, which would otherwise keep the frame rate up
+        Animation.cancel_all(self)
+        if self.prev_texture is not None:
+            self._transition_start = None
+            self.progress = 1
+            self.prev_texture = None
+        self.power.idle('transition')
+        self.stop_animation()
+
+    def check_night(self, *args):
+        """Blanks the display during the NIGHT period and turns it back on
+        afterwards.
+
+        NOTE: *args added to fit with Clock.schedule_interval call
+        """
+
+        if self.parent is None or self.parent.menu.parent is not None:
+            # The menu is open
+            return
+        night = in_period(NIGHT) and time.time() >= self.woken_until
+        if night and not self.blanked:
+            self.blank()
+        elif not night and self.blanked:
+            self.unblank()
+
+    def blank(self):
+        """Stops the slideshow and blanks the display.
+
+        The backlight is switched off where the system allows it, otherwise
+        the screen only turns black.
+        """
+
+        self.blanked = True
+        self.stop()
+        self.opacity = 0
+        set_backlight(False)
+
+    def unblank(self):
+        """Turns the display back on and continues the slideshow.
+        """
+
+        self.blanked = False
+        set_backlight(True)
+        self.opacity = 1
+        self.start()
+
+    def reconfigure(self, img_dir, time_delay, frame_orientation):
+        """Applies changed settings without creating a new Picture.
+
+        Only what depends on a changed setting is reset. Caches, the
+        prefetcher and, unless the image directory changed, the playlist
+        are kept.
+
+        :param img_dir: The path to the image directory
+        :type img_dir: str
+        :param time_delay: The time in seconds until the image shown is
+                           switched
+        :type time_delay: int or str
+        :param frame_orientation: 'landscape' or 'portrait'
+        :type frame_orientation: str
+        """
+
+        time_delay = int(time_delay)
+        if time_delay != self.time_delay:
+            self.time_delay = time_delay
+            if self.change_event is not None:
+                self.stop()
+                self.start()
+
+        turned = frame_orientation != self.__frame_orientation
+        self.__frame_orientation = frame_orientation
+
+        if img_dir != self.img_dir:
+            self.img_dir = img_dir
+            self.load_library()
+        elif turned:
+            # Images are decoded turned to fit the frame
+            self.textures.clear()
+            self.memory_cache.clear()
+            self.prefetcher.discard()
+            if self.path:
+                self.stop_animation()
+                self.texture = self.create_texture(
+                    *self.load_image(self.path))
+                self.start_animation()
+            self.prefetch()
+
+    def load_library(self):
+        """Shows the first image found in the image directory and scans the
+        rest of it in the background.
+
+        If img_dir is a pack file or a zip or tar archive instead, all its
+        images are known at once and nothing has to be scanned or watched.
+        """
+
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.stop_animation()
+        self.scan_id += 1
+        self.resumed = False
+        self.playlist.clear()
+        self.duplicates = {}
+        self.history.clear()
+        self.back = 0
+        self.textures.clear()
+        self.memory_cache.clear()
+        self.prefetcher.discard()
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+        if is_pack(self.img_dir):
+            self.container = PackFile(self.img_dir)
+        elif is_archive(self.img_dir):
+            self.container = ArchiveFile(self.img_dir, recursive=RECURSIVE,
+                                         include=INCLUDE, exclude=EXCLUDE)
+        last = self.state.load(self.img_dir)
+        if self.container is not None:
+            self.playlist.add_many(self.container.names())
+            self.playlist.mark_shown(self.state.shown())
+            self.resumed = True
+            self.change_image()
+            return
+
+        # The image on screen when the slideshow stopped is shown right away,
+        # so nothing waits for the scan to find a first image
+        if last is not None and hf.in_library(
+                last, self.img_dir, recursive=RECURSIVE, include=INCLUDE,
+                exclude=EXCLUDE):
+            self.playlist.add(last)
+            self.change_image()
+
+        # Keeps self.playlist in sync with the directory. Started before the
+        # scan, so no change during the scan is missed
+        scan_id = self.scan_id
+        self.watcher = DirectoryWatcher(
+            self.img_dir, lambda path: self.add_imgs([path], scan_id),
+            self.remove_img, poll_interval=WATCH_INTERVAL,
+            recursive=RECURSIVE, include=INCLUDE, exclude=EXCLUDE)
+        self.watcher.start()
+        self.scanner = threading.Thread(target=self.scan_library,
+                                        args=(self.scan_id, self.watcher),
+                                        daemon=True)
+        self.scanner.start()
+
+    def save_state(self, force=False):
+        """Stores the image on screen and the images shown in the current
+        round, so the next start resumes from here.
+
+        To spare the SD card, the state is written at most once a minute,
+        and not before the state of the previous run was taken over.
+
+        :param force: Writes the state regardless of when it was written
+                      last and waits until it is written, defaults to False
+        :type force: bool
+        """
+
+        if not self.path or not self.resumed:
+            return
+        now = time.monotonic()
+        if (not force and self.saved_at is not None
+                and now - self.saved_at < 60):
+            return
+        self.saved_at = now
+        self.state.save(self.img_dir, self.path, self.playlist, wait=force)
+
+    @mainthread
+    def resume(self, shown, scan_id=None):
+        """Takes over the images shown in the current round before the
+        slideshow stopped, so they are not shown again until the round is
+        over.
+
+        :param shown: The paths to the images, see PlaybackState.shown
+        :type shown: set
+        :param scan_id: If given, the images are only taken over if the scan
+                        they come from is still current, defaults to None
+        :type scan_id: int or None
+        """
+
+        if scan_id not in (None, self.scan_id):
+            return
+        self.resumed = True
+        marked = self.playlist.mark_shown(shown)
+        if marked:
+            print("Resuming the round where it was left, {} of {} images "
+                  "were shown already.".format(marked, len(self.playlist)))
+            self.prefetch()
 
     def change_image(self, *args):
-        """Updates the path to image.
+        """Shows the next image and starts decoding the ones around it.
+
+        After swiping back, the next image is the following one in history,
+        otherwise the playlist moves on. If the next image is not decoded
+        yet, this blocks until it is. Images that cannot be read are
+        skipped.
+
+        NOTE: *args added to fit with Clock.schedule_interval call
+        """
+
+        while True:
+            if self.back > 0:
+                self.back -= 1
+                path = self.history[-1 - self.back]
+            else:
+                path = self.playlist.next()
+                if path is None:
+                    # Every image was removed from the directory
+                    return
+                self.history.append(path)
+            if self.show_image(path):
+                return
+
+    def show_previous(self):
+        """Shows the image shown before the current one.
+
+        Images that cannot be read are skipped.
+
+        :return: False if there is no earlier image in history
+        :rtype: bool
+        """
+
+        shown = len(self.history) - 1 - self.back
+        while shown > 0:
+            path = self.history[shown - 1]
+            self.back = len(self.history) - shown
+            # Where the image on screen ends up if path leaves history
+            remaining = shown - list(self.history)[:shown].count(path)
+            if self.show_image(path):
+                return True
+            shown = remaining
+            self.back = len(self.history) - 1 - shown
+        return False
+
+    def navigate(self, step):
+        """Shows the next or the previous image at once, e.g. on a swipe.
+
+        The new image is shown for a whole time_delay.
+
+        :param step: 1 for the next image, -1 for the previous one
+        :type step: int
+        """
+
+        if step > 0:
+            self.change_image()
+        elif not self.show_previous():
+            return
+        self.metrics.count('swipes')
+        if self.change_event is not None:
+            self.schedule_next(time.monotonic())
+
+    def coming_up(self, n):
+        """Returns the next n images, those ahead in history first.
+
+        The playlist is not looked further ahead than one round, so the
+        first images found while scanning are not queued to be repeated.
+
+        :param n: Number of images
+        :type n: int
+
+        :rtype: list
+        """
+
+        forward = [self.history[i] for i in
+                   range(len(self.history) - self.back, len(self.history))]
+        forward = forward[:n]
+        n = min(n - len(forward), len(self.playlist) - 1)
+        if n > 0:
+            forward += self.playlist.peek(n)
+        return forward
+
+    def show_image(self, path):
+        """Shows an image and starts decoding the ones around it.
+
+        The image on screen before stays uploaded, as it is usually the
+        previous image now.
+
+        :param path: The path to the image
+        :type path: str
+
+        :return: False if the image could not be read and was removed, see
+                 forget_failed
+        :rtype: bool
+        """
+
+        start = time.perf_counter()
+        shown, shown_texture = self.path, self.texture
+        self.upcoming = self.coming_up(PREFETCH_DEPTH)
+        if path in self.upcoming:
+            # Same image chosen again soon, keep its texture around
+            prefetched = self.textures.get(path)
+        else:
+            prefetched = self.textures.pop(path, None)
+
+        texture = self.memory_cache.get(path)
+        if texture is None:
+            texture = prefetched
+        if texture is None:
+            # Not decoded in time, which stalls the slideshow
+            self.metrics.count('prefetch_misses')
+            try:
+                texture = self.create_texture(*self.prefetcher.take(path))
+            except Exception:
+                # Already reported to image_failed
+                self.forget_failed(path)
+                return False
+        self.memory_cache.put(path, texture, texture.width * texture.height
+                              * len(texture.colorfmt))
+
+        self.stop_animation()
+        if self.texture is not None and TRANSITION != 'none':
+            self.keep_previous()
+        self.path = path
+        self.texture = texture
+        self.save_state()
+        if self.prev_texture is not None:
+            self.start_transition()
+        self.start_animation()
+
+        if shown and shown != path and shown_texture is not None:
+            self.textures[shown] = shown_texture
+        self.prefetch()
+        self.metrics.count('slides')
+        self.metrics.record('change_image', time.perf_counter() - start)
+        return True
+
+    def keep_previous(self):
+        """Moves the image on screen to the previous slot, so it stays
+        visible during the transition.
+        """
+
+        Animation.cancel_all(self)
+        self.prev_texture = self.texture
+        self.prev_size = self.norm_image_size
+        self.prev_zoom = self.zoom
+        self.prev_pan = self.pan
+
+    def start_transition(self):
+        """Animates from the previous to the current image.
+
+        Both textures are already uploaded at this point, so only the
+        values read by the canvas instructions change from frame to frame.
+        """
+
+        self.power.busy('transition')
+        self._transition_start = time.perf_counter()
+        self._last_progress = None
+        self.progress = 0
+        self.zoom = 1
+        self.pan = [0, 0]
+        anim = Animation(progress=1, duration=TRANSITION_DURATION,
+                         t='in_out_quad')
+        anim.bind(on_complete=self.end_transition)
+        anim.start(self)
+
+        if TRANSITION == 'kenburns':
+            # Slowly zooms towards a random point until the next slide
+            # has faded in completely
+            hold = self.time_delay + TRANSITION_DURATION
+            reach = (KEN_BURNS_ZOOM - 1) / 2
+            Animation(zoom=KEN_BURNS_ZOOM,
+                      pan=[random.uniform(-reach, reach) * self.width,
+                           random.uniform(-reach, reach) * self.height],
+                      duration=hold).start(self)
+
+    def on_progress(self, instance, value):
+        """Positions and blends both images for the transition's progress.
+
+        :param instance: The Picture
+        :type instance: app.Picture
+        :param value: The progress of the transition between 0 and 1
+        :type value: float
+        """
+
+        now = time.perf_counter()
+        if self._last_progress is not None:
+            # A long gap between two steps is a visible stutter
+            self.metrics.record('transition_frame', now - self._last_progress)
+        self._last_progress = now
+
+        self.offset_x = self.prev_offset_x = 0
+        self.offset_y = self.prev_offset_y = 0
+        if TRANSITION == 'slide':
+            self.alpha = 1
+            self.prev_alpha = 1 if value < 1 else 0
+            # Slides to the left as seen on the frame, see check_swipe
+            if self.__frame_orientation == 'portrait':
+                self.offset_y = (1 - value) * self.height
+                self.prev_offset_y = -value * self.height
+            else:
+                self.offset_x = (1 - value) * self.width
+                self.prev_offset_x = -value * self.width
+        else:
+            self.alpha = value
+            self.prev_alpha = 1 - value
+
+    def end_transition(self, *args):
+        """Releases the previous image once the transition is over.
+
+        NOTE: *args added to fit with Animation.on_complete
+        """
+
+        self.prev_texture = None
+        if TRANSITION != 'kenburns':
+            # Ken Burns keeps moving until the next slide
+            self.power.idle('transition')
+        if self._transition_start is not None:
+            self.metrics.record('transition',
+                                time.perf_counter() - self._transition_start)
+            self._transition_start = None
+
+    def start_animation(self):
+        """Plays the image shown if it has several frames.
+
+        Its first frame is already on screen as a still image. The frames are
+        decoded on a background thread and drawn into a texture of their own,
+        so the cached still image stays untouched.
+        """
+
+        if not ANIMATE or self.container is not None:
+            return
+        if not may_be_animated(self.path):
+            return
+
+        meta = self.metadata.get(self.path)
+        self.animation = FrameStream(
+            self.path, slot=self.time_delay,
+            resolution=self.resolution if DECODE_MODE == 'display' else None,
+            orientation=(meta.orientation if meta is not None
+                         else hf.DEFAULT_ORIENTATION),
+            frame_orientation=self.__frame_orientation,
+            buffer=ANIMATION_BUFFER)
+        self.animation.start()
+        self.animation_event = Clock.schedule_once(self.show_frame, 0)
+        self.power.busy('animation')
+
+    def stop_animation(self):
+        """Stops playing the animated image shown, leaving its current frame
+        on screen.
+        """
+
+        if self.animation_event is not None:
+            self.animation_event.cancel()
+            self.animation_event = None
+        if self.animation is not None:
+            self.animation.stop()
+            self.animation = None
+        self.animation_texture = None
+        self.power.idle('animation')
+
+    def show_frame(self, *args):
+        """Shows the next frame of the animated image as soon as it is
+        decoded.
+
+        NOTE: *args added to fit with Clock.schedule_once call
+        """
+
+        frame = self.animation.get()
+        if frame is None:
+            if self.animation.finished:
+                # A still image after all
+                self.animation = None
+                self.animation_event = None
+                self.power.idle('animation')
+            else:
+                # Decoding is behind, so the frame is shown late
+                self.metrics.count('late_frames')
+                self.animation_event = Clock.schedule_once(self.show_frame,
+                                                           1 / 60)
+            return
+
+        pixels, size, colorfmt, duration = frame
+        texture = self.animation_texture
+        if (texture is None or tuple(texture.size) != size
+                or texture.colorfmt != colorfmt):
+            texture = self.animation_texture = self.create_texture(
+                pixels, size, colorfmt)
+            self.texture = texture
+        else:
+            # Reuses the texture, so playing allocates nothing on the GPU
+            with self.metrics.timer('upload'):
+                texture.blit_buffer(pixels, colorfmt=colorfmt,
+                                    bufferfmt='ubyte')
+            self.canvas.ask_update()
+        self.animation_event = Clock.schedule_once(self.show_frame, duration)
+
+    def prefetch(self):
+        """Starts decoding the next images and the previous one, and drops
+        those no longer around the current image.
+
+        Keeping both neighbours uploaded lets a swipe switch images within a
+        frame. Images already uploaded or still held by the memory cache are
+        not decoded again.
+        """
+
+        self.upcoming = self.coming_up(PREFETCH_DEPTH)
+        self.previous = None
+        if len(self.history) >= self.back + 2:
+            self.previous = self.history[-2 - self.back]
+        neighbours = self.neighbours()
+        for path in [p for p in self.textures if p not in neighbours]:
+            del self.textures[path]
+        wanted = [p for p in neighbours
+                  if p not in self.textures and p not in self.memory_cache]
+        self.prefetcher.discard(keep=wanted)
+        self.prefetcher.request(wanted)
+
+    def neighbours(self):
+        """Returns the images kept decoded around the current one.
+
+        :rtype: list
+        """
+
+        if self.previous is None or self.previous in self.upcoming:
+            return self.upcoming
+        return self.upcoming + [self.previous]
+
+    def recency_weight(self, path):
+        """Returns the weight of an image in the 'weighted' playlist order.
+
+        Recently modified images are favoured, the weight halves every
+        RECENT_HALF_LIFE days down to 1.
+
+        :param path: The path to the image
+        :type path: str
+
+        :rtype: float
+        """
+
+        meta = self.metadata.get(path)
+        if meta is None:
+            return 1.0
+        age_days = max(time.time() - meta.mtime_ns / 1e9, 0) / 86400
+        return 1.0 + RECENT_BOOST * 0.5 ** (age_days / RECENT_HALF_LIFE)
+
+    def scan_library(self, scan_id=None, watcher=None):
+        """Scans the image directory for images.
+
+        Runs on its own thread. The first image found is handed to the main
+        thread at once and the others in batches. Once the scan is complete,
+        the round of the previous run is resumed and the metadata index is
+        updated.
+
+        :param scan_id: Picture.scan_id when the scan was started, defaults to
+                        None
+        :type scan_id: int or None
+        :param watcher: Learns the images and directories from the scan,
+                        defaults to None
+        :type watcher: watcher.DirectoryWatcher or None
+        """
+
+        start = time.perf_counter()
+        if watcher is not None:
+            scan = watcher.scan()
+        else:
+            scan = hf.iter_img_paths(self.img_dir, recursive=RECURSIVE,
+                                     include=INCLUDE, exclude=EXCLUDE)
+        found = []
+        batch = []
+        for path in scan:
+            if scan_id != self.scan_id:
+                # The image directory was changed in the meantime
+                return
+            batch.append(path)
+            if len(batch) >= 500 or not found:
+                self.add_imgs(batch, scan_id)
+                found.extend(batch)
+                batch = []
+        self.add_imgs(batch, scan_id)
+        found.extend(batch)
+        self.metrics.record('scan', time.perf_counter() - start)
+        self.resume(self.state.shown(), scan_id)
+        found = [path for path in found if not self.failures.is_failed(path)]
+
+        with self.metrics.timer('index'):
+            self.metadata.update(found, root=self.img_dir)
+
+        if not self.decoders_chosen:
+            self.decoders_chosen = True
+            with self.metrics.timer('select_decoders'):
+                self.decoders.select(found, self.decode_resolution)
+
+        if self.dedup is not None:
+            with self.metrics.timer('dedup'):
+                duplicates = self.dedup.duplicates(found)
+            self.drop_duplicates(duplicates, scan_id)
+
+    @mainthread
+    def add_imgs(self, paths, scan_id=None):
+        """Adds images to the ones shown.
+
+        :param paths: The paths to the new images
+        :type paths: list
+        :param scan_id: If given, the images are only added if the scan they
+                        come from is still current, defaults to None
+        :type scan_id: int or None
+        """
+
+        if not paths or scan_id not in (None, self.scan_id):
+            return
+        paths = [path for path in paths if path not in self.duplicates]
+        readable = [path for path in paths
+                    if not self.failures.is_failed(path)]
+        if len(readable) < len(paths):
+            print("Skipping {} images that could not be read before."
+                  .format(len(paths) - len(readable)))
+            paths = readable
+        empty = not self.playlist
+        self.playlist.add_many(paths)
+        if empty:
+            # There were no images until now
+            self.change_image()
+            if self.change_event is not None:
+                self.schedule_next(time.monotonic())
+        else:
+            self.prefetch()
+
+    @mainthread
+    def remove_img(self, path):
+        """Removes an image that disappeared from the image directory.
+
+        The image stays on screen if it is currently shown.
+
+        :param path: The path to the removed image
+        :type path: str
+        """
+
+        if self.dedup is not None:
+            self.dedup.forget(path)
+        self.failures.forget(path)
+        if self.duplicates.pop(path, None) is not None:
+            return
+        if path not in self.playlist:
+            return
+        self.playlist.remove(path)
+        self.metadata.remove(path)
+        self.memory_cache.remove(path)
+        self.forget_history([path])
+        if path in self.neighbours():
+            self.prefetch()
+
+        # A duplicate of the removed image takes its place
+        others = sorted(p for p, kept in self.duplicates.items()
+                        if kept == path)
+        if others:
+            for other in others:
+                self.duplicates[other] = others[0]
+            del self.duplicates[others[0]]
+            self.add_imgs([others[0]])
+
+    @mainthread
+    def drop_duplicates(self, duplicates, scan_id=None):
+        """Removes images that duplicate others from the ones shown.
+
+        The image stays on screen if it is currently shown.
+
+        :param duplicates: Duplicates mapped to the images shown in their
+                           place, as returned by DedupIndex.duplicates
+        :type duplicates: dict
+        :param scan_id: If given, the duplicates are only dropped if the scan
+                        they come from is still current, defaults to None
+        :type scan_id: int or None
+        """
+
+        if scan_id not in (None, self.scan_id):
+            return
+        self.duplicates = duplicates
+        for path in duplicates:
+            self.playlist.remove(path)
+            self.textures.pop(path, None)
+            self.memory_cache.remove(path)
+        self.forget_history(duplicates)
+        if duplicates:
+            print("Skipping {} duplicate images.".format(len(duplicates)))
+            if set(duplicates).intersection(self.neighbours()):
+                self.prefetch()
+
+    def image_failed(self, path, error):
+        """Skips an image that could not be read from now on.
+
+        Called by the prefetcher, usually from one of its threads. Only
+        errors of the decoders about the image itself count, see
+        failures.decoding, other errors are just printed. Images on disk are
+        recorded in the failure registry, so they are skipped after a
+        restart as well until the file changes. Images of a pack or archive
+        are only skipped until the library is loaded again.
+
+        :param path: The path to the image, or its name in the source
+        :type path: str
+        :param error: What went wrong
+        :type error: Exception
+        """
+
+        if not isinstance(error, UnreadableImage):
+            # E.g. the prefetcher finishing while the app shuts down
+            print("Could not load {}: {}".format(path, error))
+            return
+        if self.container is None:
+            if self.failures.is_failed(path):
+                # Found while indexing already
+                self.drop_failed(path)
+                return
+            self.failures.add(path, error)
+        print("Could not read {}: {}".format(path, error))
+        self.drop_failed(path)
+
+    @mainthread
+    def drop_failed(self, path):
+        """Removes an image that could not be read from the ones shown.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        self.forget_failed(path)
+
+    def forget_failed(self, path):
+        """Removes an image that could not be read from the playlist, the
+        textures and history.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        if path in self.playlist:
+            self.metrics.count('read_errors')
+            self.playlist.remove(path)
+        self.textures.pop(path, None)
+        self.memory_cache.remove(path)
+        self.forget_history([path])
+        if path in self.neighbours():
+            self.prefetch()
+
+    def forget_history(self, paths):
+        """Removes images from history, so swiping back skips them.
+
+        :param paths: The paths to the images
+        :type paths: collection
+        """
+
+        if not any(path in paths for path in self.history):
+            return
+        current = len(self.history) - 1 - self.back
+        kept = [path for path in self.history if path not in paths]
+        current -= sum(1 for i, path in enumerate(self.history)
+                       if i <= current and path in paths)
+        self.history.clear()
+        self.history.extend(kept)
+        # A removed image on screen leaves the one before it current
+        self.back = min(max(len(kept) - 1 - current, 0),
+                        max(len(kept) - 1, 0))
+
+    def on_window_size(self, window, size):
+        """Keeps track of the window size for the decoding threads.
+
+        :param window: The application window
+        :type window: kivy.core.window.WindowBase
+        :param size: The new window size
+        :type size: (int, int)
+        """
+
+        self.resolution = tuple(size)
+
+    @property
+    def decode_resolution(self):
+        """The size images are decoded for, None for their native size."""
+
+        return self.resolution if DECODE_MODE == 'display' else None
+
+    def load_image(self, path):
+        """Decodes an image turned upright for the frame.
+
+        Runs on a worker thread of the prefetcher. The exif orientation is
+        taken from the metadata index and applied to the pixels, see
+        helper_func.decode_img. Each format is decoded by the fastest
+        backend, see decoders.DecoderChoice. Display-sized images are taken
+        from the disk cache if possible and added to it otherwise. Images of
+        a pack file are already decoded and returned without copying them,
+        images of an archive are decoded from memory.
+
+        :param path: The path to the image, or its name in the source
+        :type path: str
+
+        :return: The pixel data, its size and its colour format
+        :rtype: (bytes-like, (int, int), str)
+        """
+
+        frame_orientation = self.__frame_orientation
+        resolution = self.decode_resolution
+        if self.container is not None:
+            name = ('load_packed' if isinstance(self.container, PackFile)
+                    else 'decode')
+            with self.metrics.timer(name), decoding():
+                return self.container.load(path, resolution,
+                                           frame_orientation)
+
+        with self.metrics.timer('exif'):
+            orientation = self.metadata.orientation(path)
+
+        if self.disk_cache is None or resolution is None:
+            with self.metrics.timer('decode'), decoding():
+                return self.decoders.decode(path, resolution, orientation,
+                                            frame_orientation)
+
+        key = self.disk_cache.key(path, resolution, orientation,
+                                  frame_orientation)
+        cached = self.disk_cache.get(key)
+        if cached is not None:
+            # Cached images are already turned
+            try:
+                with self.metrics.timer('decode_cached'):
+                    return self.decoders.decode(cached)
+            except Exception as e:
+                # A damaged cache file, the original may still be fine
+                print("Could not read the cached copy of {}: {}"
+                      .format(path, e))
+
+        with self.metrics.timer('decode'), decoding():
+            pixels, size, colorfmt = self.decoders.decode(
+                path, resolution, orientation, frame_orientation)
+        self.disk_cache.put(key, pixels, size, colorfmt)
+        return pixels, size, colorfmt
+
+    @mainthread
+    def upload_image(self, path, result):
+        """Uploads a decoded image to the GPU while the current one is still
+        shown.
+
+        :param path: The path to the image
+        :type path: str
+        :param result: The return value of load_image
+        :type result: tuple
+        """
+
+        if path not in self.neighbours() or path in self.textures:
+            # Either shown in the meantime or no longer wanted
+            return
+
+        self.prefetcher.forget(path)
+        self.textures[path] = self.create_texture(*result)
+
+    def create_texture(self, pixels, size, colorfmt):
+        """Creates a texture from a decoded pixel buffer.
+
+        :param pixels: The pixel data as returned by helper_func.decode_img
+            or pack.PackFile.load
+        :type pixels: bytes-like
+        :param size: Width and height of the image
+        :type size: (int, int)
+        :param colorfmt: 'rgb' or 'rgba'
+        :type colorfmt: str
+
+        :rtype: kivy.graphics.texture.Texture
+        """
+
+        with self.metrics.timer('upload'):
+            texture = Texture.create(size=size, colorfmt=colorfmt)
+            texture.blit_buffer(pixels, colorfmt=colorfmt, bufferfmt='ubyte')
+        # Pillow stores the rows top to bottom, OpenGL bottom to top
+        texture.flip_vertical()
+        return texture
+
+    def toggle_overlay(self):
+        """Shows or hides the metrics on top of the image.
+        """
+
+        if self.overlay is not None:
+            self.overlay_event.cancel()
+            self.overlay_event = None
+            self.remove_widget(self.overlay)
+            self.overlay = None
+            return
+
+        self.overlay = Label(font_name='RobotoMono-Regular', font_size='12sp',
+                             halign='left', valign='top', markup=False)
+        with self.overlay.canvas.before:
+            Color(0, 0, 0, 0.6)
+            self._overlay_bg = Rectangle()
+        self.add_widget(self.overlay)
+        self.update_overlay()
+        self.overlay_event = Clock.schedule_interval(self.update_overlay, 1)
+
+    def update_overlay(self, *args):
+        """Refreshes the metrics shown by the overlay.
 
         NOTE: *args added to fit with Clock.schedule_interval call
         """
 
-        self.source = random.choice(self.imgs)
-        self.set_angle()
+        overlay = self.overlay
+        overlay.text = format_overlay(self.metrics.snapshot())
+        overlay.texture_update()
+        overlay.size = overlay.texture_size
+        overlay.pos = (self.x + 10, self.top - overlay.height - 10)
+        self._overlay_bg.pos = overlay.pos
+        self._overlay_bg.size = overlay.size
 
     @property
     def img_dir(self):
@@ -147,59 +1278,6 @@ class Picture(Image):
     def img_dir(self):
         del self._img_dir
 
-    def set_angle(self):
-        """
-        Rotates the image according to its original orientation to fit the
-        screen.
-        
-        Original orientation is obtained using EXIF data using the
-        Pillow library (see helper.func.py). Depending on screen orientation,
-        you can choose either landscape or portrait. The function with rotate
-        accordingly.
-
-        Anything but 1 and 6 are untested as I have not had any images like
-        that.
-
-        Currently, flipping images is not supported. In landscape that would be
-        EXIF values 2, 4, 5 and 7. If there is an issue, please contact me and
-        send me an example image.
-
-        Reference:
-        https://www.daveperrett.com/articles/2012/07/28/exif-orientation-handling-is-a-ghetto/
-        """
-
-        o = hf.get_img_orientation(self.source)
-        if self.__frame_orientation == "landscape":
-            # This is landscape orientation
-            if o == 1:
-                self.angle = 0
-            elif o == 3:
-                self.angle = -180
-            elif o == 6:
-                self.angle = -90
-            elif o == 8:
-                self.angle = 90
-            else:
-                print("No valid image orientation value in the EXIF.\
-                 Use as is.")
-
-        elif self.__frame_orientation == "portrait":
-            if o == 1:
-                self.angle = 90
-            elif o == 3:
-                self.angle = -90
-            # This is portrait orientation
-            elif o == 6:
-                self.angle = 0
-            elif o == 8:
-                self.angle = -180
-            else:
-                print("No valid image orientation value in the EXIF.\
-                 Use as is.")
-        else:
-            raise SyntaxError("No valid image orientation was given. Did you\
-                              check spelling?")
-
     def on_touch_down(self, touch):
         """Kivy standard function to capture a touch event and to link
            it to a method
@@ -208,26 +1286,106 @@ class Picture(Image):
         :type touch: kivy.input.providers.mouse.MouseMotionEvent
         """
 
+        # Taps come in at the idle frame rate, so the ones following are
+        # timed at full rate
+        self.power.busy('touch')
+        if self.touch_event is not None:
+            self.touch_event.cancel()
+        self.touch_event = Clock.schedule_once(
+            lambda dt: self.power.idle('touch'), 2)
+
+        if self.blanked:
+            # Shows the images for a while during the night
+            self.woken_until = time.time() + NIGHT_WAKE * 60
+            self.unblank()
+            return True
+
+        # Followed by on_touch_move and on_touch_up to detect swipes
+        touch.ud['picture'] = 'down'
+
         # Reference:
         # https://stackoverflow.com/questions/64741710/python-3-kivy-react-only-to-double-tap-not-single-tap/64743622#64743622
         if self.scheduled_event is not None:
             self.scheduled_event.cancel()
             self.scheduled_event = None
 
-        if touch.is_double_tap:
-            self.parent.fullscreen_toggle()
+        # 0.5 seems to be the right balance between response time and
+        # ability to click fast enough. May differ on touchscreen
+        double_tap_wait_s = 0.5
+        if touch.is_triple_tap:
+            self.toggle_overlay()
+
+        elif touch.is_double_tap:
+            # Waits for a third tap
+            self.scheduled_event = Clock.schedule_once(
+                lambda dt: self.parent.fullscreen_toggle(), double_tap_wait_s)
 
         else:
-            # 0.5 seems to be the right balance between response time and
-            # ability to click fast enough. May differ on touchscreen
-            double_tap_wait_s = 0.5
             self.scheduled_event = Clock.schedule_once(self.open_menu,
                                                        double_tap_wait_s)
 
+    def on_touch_move(self, touch):
+        """Kivy standard function called while a touch moves. Switches
+        images on a swipe as soon as it is recognised.
+
+        :param touch: a touch or click event with the screen
+        :type touch: kivy.input.providers.mouse.MouseMotionEvent
+        """
+
+        return self.check_swipe(touch)
+
+    def on_touch_up(self, touch):
+        """Kivy standard function called when a touch ends. Catches quick
+        swipes that moved far between two events.
+
+        :param touch: a touch or click event with the screen
+        :type touch: kivy.input.providers.mouse.MouseMotionEvent
+        """
+
+        return self.check_swipe(touch)
+
+    def check_swipe(self, touch):
+        """Shows the next image on a swipe to the left and the previous one
+        on a swipe to the right, as seen on the frame.
+
+        A touch moving further than a tap cancels the pending tap action, so
+        a swipe never opens the menu.
+
+        :param touch: a touch or click event with the screen
+        :type touch: kivy.input.providers.mouse.MouseMotionEvent
+
+        :return: Whether the touch was handled as a swipe
+        :rtype: bool
+        """
+
+        if touch.ud.get('picture') != 'down':
+            return False
+        dx, dy = touch.x - touch.ox, touch.y - touch.oy
+        if self.__frame_orientation == 'portrait':
+            # The screen is turned clockwise, so the frame's right points
+            # to the top of the window
+            along, across, length = dy, dx, self.height
+        else:
+            along, across, length = dx, dy, self.width
+
+        if (self.scheduled_event is not None
+                and max(abs(dx), abs(dy)) > SWIPE_DISTANCE * length / 4):
+            # Too far for a tap
+            self.scheduled_event.cancel()
+            self.scheduled_event = None
+        if abs(along) < SWIPE_DISTANCE * length or abs(across) > abs(along):
+            return False
+
+        touch.ud['picture'] = 'swiped'
+        self.navigate(1 if along < 0 else -1)
+        return True
+
     def open_menu(self, *args):
         """On single tap, opens Menu Class to set configurations.
         """
 
+        self.stop()
+        self.power.busy('menu')
         self.parent.add_widget(self.parent.menu)
         self.parent.remove_widget(self.parent.picture)
 
@@ -284,9 +1442,12 @@ class Menu(BoxLayout):
             self.ids["img_dir_text"].text = IMG_DIR
             self.ids["td_spin"].text_value = TIME_DELAY
 
-        self.parent.picture = Picture(img_dir=IMG_DIR,
-                                      time_delay=TIME_DELAY,
-                                      frame_orientation=FRAME_ORIENTATION)
+        # The same Picture is kept, so its playlist and caches survive
+        self.parent.picture.power.idle('menu')
+        self.parent.picture.reconfigure(img_dir=IMG_DIR,
+                                        time_delay=TIME_DELAY,
+                                        frame_orientation=FRAME_ORIENTATION)
+        self.parent.picture.start()
         self.parent.add_widget(self.parent.picture)
         self.parent.remove_widget(self.parent.menu)
 
@@ -419,14 +1580,76 @@ class DirDialog(FloatLayout):
 class SlideShowApp(App):
     """The kivy.app Child starting the construction.
     """
-    def __init__(self, menu_start=False, *args, **kwargs):
+    def __init__(self, menu_start=False, started=None, *args, **kwargs):
         super(SlideShowApp, self).__init__(*args, **kwargs)
         self.menu_start = menu_start
+        # time.monotonic() at process start, given to report the startup time
+        self.started = started
 
     def build(self):
+        Window.fullscreen = 'auto'
+        window_at = time.monotonic()
         root = RootWidget(menu_start=self.menu_start)
+        if self.started is not None:
+            self.report_startup(root.picture, window_at)
+
+        metrics = root.picture.metrics
+        self.metrics_log = None
+        if METRICS_LOG:
+            self.metrics_log = MetricsLog(metrics, METRICS_LOG,
+                                          interval=METRICS_LOG_INTERVAL,
+                                          max_mb=METRICS_LOG_MB)
+            self.metrics_log.start()
+        self.metrics_server = None
+        if METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(metrics, METRICS_PORT)
+            except OSError as e:
+                print("Could not serve metrics on port {}: {}".format(
+                    METRICS_PORT, e))
+            else:
+                self.metrics_server.start()
         return root
 
+    def report_startup(self, picture, window_at):
+        """Prints how long the start took once the first image is on screen
+        and quits.
+
+        :param picture: The picture showing the images
+        :type picture: Picture
+        :param window_at: time.monotonic() once the window was open
+        :type window_at: float
+        """
+
+        def report(*args):
+            if picture.texture is None:
+                return
+            picture.unbind(texture=report)
+            # The image is drawn with the next frame
+            Clock.schedule_once(done, 0)
+
+        def done(dt):
+            print("Startup: window after {:.3f} s, first image after {:.3f} s"
+                  .format(window_at - self.started,
+                          time.monotonic() - self.started))
+            self.stop()
+
+        picture.bind(texture=report)
+        report()
+
+    def on_stop(self):
+        self.root.picture.save_state(force=True)
+        if self.metrics_log is not None:
+            self.metrics_log.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        stats = self.root.picture.memory_cache.stats()
+        print("Memory cache: {hits} hits, {misses} misses ({hit_rate:.0%}), "
+              "{evictions} evictions, {entries} images in {mb:.1f} of "
+              "{max_mb:.0f} MB.".format(mb=stats['bytes'] / 1024 ** 2,
+                                        max_mb=stats['max_bytes'] / 1024 ** 2,
+                                        **stats))
+
 
 Factory.register('Menu', cls=Menu)
 Factory.register('DirDialog', cls=DirDialog)
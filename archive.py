@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+Zip and tar archives as image libraries for the SlideShow4RaspberryPi project
+"""
+
+
+import io
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+
+import helper_func as hf
+
+
+def is_archive(path):
+    """Returns whether a path points to a zip or tar archive.
+
+    :param path: The path to check
+    :type path: str
+
+    :rtype: bool
+    """
+
+    if not os.path.isfile(path):
+        return False
+    try:
+        return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+    except OSError:
+        return False
+
+
+class ArchiveFile:
+    """Shows the images in a zip or tar archive without extracting it.
+
+    The archive is opened and its members listed once. For zip files, the
+    listing only reads the central directory at the end of the file, for
+    uncompressed tar files only the headers of the members. Images are read
+    into memory one at a time and decoded from there.
+
+    Compressed tar files work as well, but slowly, as reaching a member
+    means decompressing the archive up to it.
+
+    :param path: The path to the archive
+    :type path: str
+    :param recursive: Whether images in subdirectories of the archive are
+                      shown, defaults to True
+    :type recursive: bool
+    :param include: See helper_func.iter_img_paths, defaults to ()
+    :type include: iterable
+    :param exclude: See helper_func.iter_img_paths, defaults to ()
+    :type exclude: iterable
+    """
+
+    def __init__(self, path, recursive=True, include=(), exclude=()):
+        """Constructor method
+        """
+
+        self.path = path
+        # zipfile reads members from several threads safely, tarfile does not
+        self._lock = threading.Lock()
+        self._zip = None
+        self._tar = None
+        # Name -> member, in the order of the archive
+        self.entries = {}
+
+        if zipfile.is_zipfile(path):
+            self._zip = zipfile.ZipFile(path)
+            members = ((info.filename, info) for info in
+                       self._zip.infolist() if not info.is_dir())
+        else:
+            self._tar = tarfile.open(path, 'r:*')
+            members = ((info.name, info) for info in
+                       self._tar.getmembers() if info.isfile())
+
+        for name, info in members:
+            # Tar files made with 'tar -C dir .' prefix every name with ./
+            name = posixpath.normpath(name)
+            if hf.is_library_member(name, recursive, include, exclude):
+                self.entries[name] = info
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def names(self):
+        """Returns the names of all images in the order of the archive.
+
+        :rtype: list
+        """
+
+        return list(self.entries)
+
+    def read(self, name):
+        """Returns the contents of a member.
+
+        :param name: The name of the member
+        :type name: str
+
+        :rtype: bytes
+        """
+
+        info = self.entries[name]
+        if self._zip is not None:
+            return self._zip.read(info)
+        with self._lock:
+            return self._tar.extractfile(info).read()
+
+    def load(self, name, resolution=None, frame_orientation='landscape'):
+        """Decodes an image turned upright for the frame.
+
+        :param name: The name of the image in the archive
+        :type name: str
+        :param resolution: The size the image is displayed at, defaults to
+                           None meaning native resolution
+        :type resolution: (int, int) or None
+        :param frame_orientation: 'landscape' or 'portrait', defaults to
+                                  'landscape'
+        :type frame_orientation: str
+
+        :return: The pixel data, its size and its colour format
+        :rtype: (bytes, (int, int), str)
+        """
+
+        data = io.BytesIO(self.read(name))
+        orientation = hf.read_img_metadata(data)[0]
+        data.seek(0)
+        return hf.decode_img(data, resolution, orientation, frame_orientation)
+
+    def close(self):
+        """Closes the archive.
+        """
+
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
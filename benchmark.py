@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+"""
+Headless benchmarks for the SlideShow4RaspberryPi project.
+
+Generates a synthetic image library in a temporary directory and times
+scanning, exif lookups, decoding and switching slides. The results are
+written as JSON, so runs of different versions can be compared.
+
+No display is needed. Kivy renders into SDL's offscreen video driver and the
+slide switch benchmark is skipped if that is not available.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+import decoders
+import helper_func as hf
+from metadata import MetadataIndex
+from playlist import Playlist
+
+SIZES = [(640, 480), (1920, 1080), (4000, 3000)]
+FORMATS = ['jpg', 'png', 'gif', 'bmp']
+RESOLUTION = (1920, 1080)
+
+
+def make_library(root, count):
+    """Writes count synthetic images of varying size, format and exif
+    orientation into root.
+
+    :return: The paths of the images
+    :rtype: list
+    """
+
+    # Noise on top of a gradient compresses like a photo rather than like a
+    # flat colour
+    bases = {}
+    for size in SIZES:
+        noise = Image.effect_noise(size, 48)
+        gradient = Image.linear_gradient('L').resize(size)
+        bases[size] = Image.merge('RGB',
+                                  (noise, gradient, gradient.rotate(180)))
+
+    paths = []
+    for i in range(count):
+        size = SIZES[i % len(SIZES)]
+        fmt = FORMATS[(i // len(SIZES)) % len(FORMATS)]
+        orientation = i % 8 + 1
+        img = bases[size]
+
+        subdir = os.path.join(root, '{:04d}'.format(2000 + i % 5))
+        os.makedirs(subdir, exist_ok=True)
+        path = os.path.join(subdir, 'img_{:05d}.{}'.format(i, fmt))
+        if fmt == 'jpg':
+            exif = Image.Exif()
+            exif[hf.EXIF_ORIENTATION] = orientation
+            img.save(path, quality=90, exif=exif)
+        elif fmt == 'gif':
+            img.convert('P').save(path)
+        else:
+            img.save(path)
+        paths.append(path)
+    return paths
+
+
+def measure(func, repeat):
+    """Calls func repeat times and returns statistics in milliseconds.
+
+    :rtype: dict
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'n': repeat,
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'mean_ms': round(statistics.mean(times), 3),
+        'max_ms': round(max(times), 3),
+        }
+
+
+def bench_scan(root, repeat):
+    """Times listing the library."""
+
+    first = os.path.join(root, sorted(os.listdir(root))[0])
+    return {
+        'list_img_paths': measure(lambda: hf.list_img_paths(first), repeat),
+        'iter_img_paths': measure(lambda: list(hf.iter_img_paths(root)),
+                                  repeat),
+        'iter_img_paths_first': measure(
+            lambda: next(hf.iter_img_paths(root)), repeat),
+        }
+
+
+def bench_orientation(paths, db_path, repeat):
+    """Times reading the exif orientation from the files and the index."""
+
+    index = MetadataIndex(db_path)
+    index.update(paths)
+
+    def each(func):
+        return lambda: [func(p) for p in paths]
+
+    per_image = {
+        'get_img_orientation': measure(each(hf.get_img_orientation), repeat),
+        'read_img_metadata': measure(each(hf.read_img_metadata), repeat),
+        'metadata_index': measure(each(index.orientation), repeat),
+        }
+    # Reported per image rather than per pass
+    for result in per_image.values():
+        for key in ('min_ms', 'median_ms', 'mean_ms', 'max_ms'):
+            result[key] = round(result[key] / len(paths), 4)
+    return per_image
+
+
+def bench_decode(paths, repeat):
+    """Times decoding at native and at display resolution, and every decoder
+    backend except kivy's at display resolution."""
+
+    results = {}
+    for path in paths[:len(SIZES) * len(FORMATS)]:
+        ext = path.rsplit('.', 1)[1]
+        with Image.open(path) as img:
+            name = '{}_{}x{}'.format(ext, *img.size)
+        results[name] = {
+            'full': measure(lambda: hf.decode_img(path), repeat),
+            'display': measure(lambda: hf.decode_img(path, RESOLUTION),
+                               repeat),
+            }
+        for backend in decoders.BACKENDS.values():
+            if (backend.name != 'kivy' and ext in backend.formats
+                    and backend.available()):
+                results[name][backend.name] = measure(
+                    lambda: backend.decode(path, RESOLUTION), repeat)
+    return results
+
+
+def bench_playlist(repeat, count=100000):
+    """Times building and advancing a large playlist."""
+
+    paths = ['/photos/{:06d}.jpg'.format(i) for i in range(count)]
+
+    def build():
+        playlist = Playlist(seed=0)
+        playlist.add_many(paths)
+        return playlist
+
+    playlist = build()
+
+    def advance():
+        for _ in range(1000):
+            playlist.next()
+            playlist.peek(3)
+
+    return {
+        'build_{}'.format(count): measure(build, repeat),
+        'next_and_peek_x1000': measure(advance, repeat),
+        }
+
+
+def bench_change_image(root, count, repeat):
+    """Times Picture.change_image with and without a prefetched texture."""
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+    os.environ['KIVY_NO_ARGS'] = '1'
+    # app reads settings.conf from the working directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        import app
+        from kivy.clock import Clock
+    except Exception as e:
+        return {'skipped': 'Kivy could not start: {}'.format(e)}
+
+    app.DISK_CACHE_MB = 0
+    app.INDEX_FILE = os.path.join(root, '.picture.sqlite')
+    app.STATE_FILE = os.path.join(root, '.state.json')
+    app.LIBRARY_FILE = os.path.join(root, '.library')
+    app.DECODER_FILE = os.path.join(root, '.decoders.json')
+    # Neither timing the decoders nor hashing for duplicates may run on the
+    # scan thread while change_image is measured
+    app.DECODER = 'pillow_draft'
+    app.DEDUP = False
+    app.TRANSITION = 'none'
+    picture = app.Picture(img_dir=root, time_delay=3600,
+                          frame_orientation='landscape')
+    picture.stop()
+    if picture.scanner is not None:
+        picture.scanner.join()
+
+    deadline = time.monotonic() + 30
+    while len(picture.playlist) < count and time.monotonic() < deadline:
+        Clock.tick()
+
+    def cold():
+        picture.prefetcher.discard()
+        picture.textures.clear()
+        picture.change_image()
+
+    def warm():
+        deadline = time.monotonic() + 30
+        while (picture.upcoming and picture.upcoming[0] not in
+               picture.textures and time.monotonic() < deadline):
+            time.sleep(0.005)
+            Clock.tick()
+        start = time.perf_counter()
+        picture.change_image()
+        return (time.perf_counter() - start) * 1000
+
+    results = {'cold': measure(cold, repeat)}
+    times = [warm() for _ in range(repeat)]
+    results['prefetched'] = {
+        'n': repeat,
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'mean_ms': round(statistics.mean(times), 3),
+        'max_ms': round(max(times), 3),
+        }
+    picture.watcher.stop()
+    picture.prefetcher.shutdown()
+    return results
+
+
+def parse_arguments(argv):
+    """Setup argument parser for command line arguments."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', '-n', dest='images', type=int, default=24,
+                        help='Number of synthetic images to generate.')
+    parser.add_argument('--repeat', '-r', dest='repeat', type=int, default=5,
+                        help='Number of repetitions of every measurement.')
+    parser.add_argument('--output', '-o', dest='output', default=None,
+                        help='File to write the JSON results to, defaults '
+                        'to stdout.')
+    parser.add_argument('--no-kivy', dest='kivy', action='store_false',
+                        help='Skips the slide switch benchmark.')
+    return vars(parser.parse_args(argv))
+
+
+def main(argv=None):
+    """Runs all benchmarks and writes the results."""
+
+    args = parse_arguments(argv if argv is not None else sys.argv[1:])
+
+    # Messages of the slideshow must not end up in the JSON output
+    with tempfile.TemporaryDirectory(prefix='slideshow-bench-') as root, \
+            contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        paths = make_library(root, args['images'])
+        results = {
+            'meta': {
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'platform': platform.platform(),
+                'images': args['images'],
+                'repeat': args['repeat'],
+                'resolution': RESOLUTION,
+                'generate_s': round(time.perf_counter() - start, 3),
+                },
+            'scan': bench_scan(root, args['repeat']),
+            'orientation': bench_orientation(
+                paths, os.path.join(root, '.bench.sqlite'), args['repeat']),
+            'decode': bench_decode(paths, args['repeat']),
+            'playlist': bench_playlist(args['repeat']),
+            }
+        if args['kivy']:
+            results['change_image'] = bench_change_image(
+                root, args['images'], args['repeat'])
+
+    output = json.dumps(results, indent=2)
+    if args['output']:
+        with open(args['output'], 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
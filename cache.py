@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+"""
+Caches of decoded and pre-scaled images for the SlideShow4RaspberryPi project
+"""
+
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+import os
+import re
+import threading
+import time
+
+from PIL import Image
+
+
+# Names of the files written by DiskCache
+ENTRY_NAME = re.compile(r'[0-9a-f]{40}\.(jpg|png)(\.tmp)?$')
+
+
+class DiskCache:
+    """Keeps display-sized copies of images on disk, so that large originals
+    are only decoded once.
+
+    Entries are keyed by path, modification time and size of the original
+    together with the target resolution and orientations, so a changed file
+    simply misses and its stale entry ages out. The least recently used
+    entries are deleted once the cache exceeds its size limit. Only files
+    named like the entries it writes are ever deleted, other files in
+    cache_dir are left alone.
+
+    :param cache_dir: Directory the cached images are stored in
+    :type cache_dir: str
+    :param max_mb: Size limit of the cache in megabytes
+    :type max_mb: int
+    """
+
+    def __init__(self, cache_dir, max_mb):
+        """Constructor method
+        """
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Entries are written by a single thread, so the workers decoding
+        # images never wait for an encoder
+        self._writer = ThreadPoolExecutor(max_workers=1,
+                                          thread_name_prefix='cache')
+        # Key -> (filename, size in bytes), least recently used first
+        self._entries = OrderedDict()
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self._load_entries()
+
+    @staticmethod
+    def key(path, resolution, orientation, frame_orientation):
+        """Returns the cache key of an image.
+
+        :param path: The path to the original image
+        :type path: str
+        :param resolution: The size the image is decoded for
+        :type resolution: (int, int)
+        :param orientation: The exif orientation of the image
+        :type orientation: int
+        :param frame_orientation: 'landscape' or 'portrait'
+        :type frame_orientation: str
+
+        :rtype: str
+        """
+
+        st = os.stat(path)
+        ident = '{}\0{}\0{}\0{}x{}\0{}\0{}'.format(
+            os.path.abspath(path), st.st_mtime_ns, st.st_size,
+            resolution[0], resolution[1], orientation, frame_orientation)
+        return sha1(ident.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def get(self, key):
+        """Returns the path of a cached image and marks it as recently used.
+
+        :param key: The key returned by DiskCache.key
+        :type key: str
+
+        :return: The path to the cached image or None on a miss
+        :rtype: str or None
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+        fname = os.path.join(self.cache_dir, entry[0])
+        try:
+            # The modification time orders the entries across restarts
+            os.utime(fname)
+        except OSError:
+            with self._lock:
+                self._drop(key)
+            return None
+        return fname
+
+    def put(self, key, pixels, size, colorfmt):
+        """Stores a decoded image in the background.
+
+        :param key: The key returned by DiskCache.key
+        :type key: str
+        :param pixels: The pixel data as returned by helper_func.decode_img
+        :type pixels: bytes
+        :param size: Width and height of the image
+        :type size: (int, int)
+        :param colorfmt: 'rgb' or 'rgba'
+        :type colorfmt: str
+        """
+
+        try:
+            self._writer.submit(self._write, key, pixels, size, colorfmt)
+        except RuntimeError:
+            # Raised once the interpreter shuts down, while the app stops
+            pass
+
+    def stats(self):
+        """Returns the counters and the size of the cache.
+
+        :rtype: dict
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._total,
+            'max_bytes': self.max_bytes,
+            }
+
+    def _write(self, key, pixels, size, colorfmt):
+        img = Image.frombytes(colorfmt.upper(), size, pixels)
+        if colorfmt == 'rgba':
+            entry = key + '.png'
+            fmt, params = 'PNG', {}
+        else:
+            entry = key + '.jpg'
+            fmt, params = 'JPEG', {'quality': 90}
+
+        fname = os.path.join(self.cache_dir, entry)
+        tmp = fname + '.tmp'
+        try:
+            img.save(tmp, fmt, **params)
+            os.replace(tmp, fname)
+            nbytes = os.path.getsize(fname)
+        except OSError as e:
+            print("Could not write to the image cache:", e)
+            return
+
+        with self._lock:
+            self._drop(key, remove=False)
+            self._entries[key] = (entry, nbytes)
+            self._total += nbytes
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key, remove=True):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total -= entry[1]
+        if remove:
+            try:
+                os.remove(os.path.join(self.cache_dir, entry[0]))
+            except OSError:
+                pass
+
+    def _load_entries(self):
+        found = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if (not ENTRY_NAME.match(entry.name)
+                        or not entry.is_file(follow_symlinks=False)):
+                    continue
+                if entry.name.endswith('.tmp'):
+                    # Left behind by an interrupted write
+                    os.remove(entry.path)
+                    continue
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, st.st_size))
+
+        for _, name, nbytes in sorted(found):
+            self._entries[name.split('.')[0]] = (name, nbytes)
+            self._total += nbytes
+        # The limit may have been lowered since the last run
+        while self._total > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+
+def available_memory():
+    """Returns the memory available to new allocations without swapping, as
+    reported by the kernel.
+
+    :return: Available memory in bytes or None if it is not known
+    :rtype: int or None
+    """
+
+    try:
+        with open('/proc/meminfo', 'rb') as f:
+            for line in f:
+                if line.startswith(b'MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class MemoryCache:
+    """Keeps recently shown images in memory, so that images coming up again
+    soon, as in small libraries, are neither decoded nor uploaded again.
+
+    The least recently used entries are evicted once the cache exceeds its
+    budget, and also while the system runs low on memory, so the cache never
+    pushes the Raspberry Pi into swapping. Hits and misses are counted to help
+    choosing the budget.
+
+    :param max_mb: Budget of the cache in megabytes, 0 disables it
+    :type max_mb: float
+    :param min_available_mb: Entries are evicted while less memory than this
+                             is available, defaults to 100
+    :type min_available_mb: float
+    :param check_interval: Minimum seconds between two looks at the available
+                           memory, defaults to 1
+    :type check_interval: float
+    """
+
+    def __init__(self, max_mb, min_available_mb=100, check_interval=1):
+        """Constructor method
+        """
+
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.min_available = int(min_available_mb * 1024 * 1024)
+        self.check_interval = check_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # Key -> (value, size in bytes), least recently used first
+        self._entries = OrderedDict()
+        self._total = 0
+        self._checked = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def nbytes(self):
+        """Bytes currently held by the cache."""
+
+        return self._total
+
+    def get(self, key):
+        """Returns a cached value and marks it as recently used.
+
+        :param key: The key the value was stored with
+        :type key: hashable
+
+        :return: The value or None on a miss
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        """Stores a value, evicting others if needed.
+
+        Values larger than the whole budget are not stored.
+
+        :param key: The key to store the value with
+        :type key: hashable
+        :param value: The value, e.g. a texture
+        :param nbytes: The memory the value takes up
+        :type nbytes: int
+        """
+
+        with self._lock:
+            self._pop(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self._total += nbytes
+            while self._total > self.max_bytes:
+                self._evict()
+        self.trim()
+
+    def remove(self, key):
+        """Drops a value from the cache.
+
+        :param key: The key the value was stored with
+        :type key: hashable
+        """
+
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        """Drops all values.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def trim(self, force=False):
+        """Evicts entries while the system is low on memory.
+
+        The available memory is looked at once per check_interval at most.
+
+        :param force: Looks at the available memory regardless of when it
+                      was looked at last, defaults to False
+        :type force: bool
+
+        :return: Number of evicted entries
+        :rtype: int
+        """
+
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return 0
+        self._checked = now
+
+        available = available_memory()
+        if available is None or available >= self.min_available:
+            return 0
+        # Freed memory only shows up in the kernel's numbers later, so evict
+        # as much as is missing instead of looking again after every entry
+        missing = self.min_available - available
+        evicted = 0
+        with self._lock:
+            while missing > 0 and self._entries:
+                missing -= self._evict()
+                evicted += 1
+        return evicted
+
+    def stats(self):
+        """Returns the counters and the size of the cache.
+
+        :rtype: dict
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._total,
+            'max_bytes': self.max_bytes,
+            }
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total -= entry[1]
+
+    def _evict(self):
+        _, (_, nbytes) = self._entries.popitem(last=False)
+        self._total -= nbytes
+        self.evictions += 1
+        return nbytes
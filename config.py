@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+Settings of the SlideShow4RaspberryPi project, read once from settings.conf
+
+Kept apart from the app, so the command line tools can use them without
+importing kivy.
+"""
+
+import configparser as cp
+import os
+from os.path import join, isdir
+
+from archive import is_archive
+from pack import is_pack
+from power import parse_period
+
+CONFIGFILE = 'settings.conf'
+
+CONFIG = cp.ConfigParser()
+CONFIG.read(CONFIGFILE)
+
+# Configuration
+FRAME_ORIENTATION = CONFIG['SLIDESHOW']['frame_orientation']
+
+if (isdir(CONFIG['SLIDESHOW']['img_dir'])
+        or is_pack(CONFIG['SLIDESHOW']['img_dir'])
+        or is_archive(CONFIG['SLIDESHOW']['img_dir'])):
+    IMG_DIR = CONFIG['SLIDESHOW']['img_dir']
+else:
+    IMG_DIR = os.getcwd()
+
+TIME_DELAY = CONFIG['SLIDESHOW']['time_delay']
+
+# Library scanning, optional in the config file
+# Whether images in subdirectories of IMG_DIR are shown as well
+RECURSIVE = CONFIG.getboolean('SLIDESHOW', 'recursive', fallback=True)
+# Comma separated glob patterns relative to IMG_DIR
+INCLUDE = [p.strip() for p in
+           CONFIG.get('SLIDESHOW', 'include', fallback='').split(',')
+           if p.strip()]
+EXCLUDE = [p.strip() for p in
+           CONFIG.get('SLIDESHOW', 'exclude', fallback='').split(',')
+           if p.strip()]
+# Whether only one of several identical images is shown
+DEDUP = CONFIG.getboolean('SLIDESHOW', 'dedup', fallback=True)
+
+# Navigation, optional in the config file
+# Number of recently shown images that can be swiped back to
+HISTORY_SIZE = CONFIG.getint('SLIDESHOW', 'history', fallback=50)
+# A swipe needs to move this fraction of the frame's width
+SWIPE_DISTANCE = 0.1
+
+# Playlist, optional in the config file
+# 'shuffle', 'sequential' or 'weighted', see playlist.Playlist
+PLAYLIST_ORDER = CONFIG.get('SLIDESHOW', 'order', fallback='shuffle')
+# In 'weighted' order, images modified just now get this much weight on top
+# of the base weight of 1, halving every RECENT_HALF_LIFE days
+RECENT_BOOST = CONFIG.getfloat('SLIDESHOW', 'recent_boost', fallback=4)
+RECENT_HALF_LIFE = CONFIG.getfloat('SLIDESHOW', 'recent_half_life',
+                                   fallback=30)
+
+# Transitions, optional in the config file
+# 'none', 'crossfade', 'slide' or 'kenburns' (crossfade with pan and zoom)
+TRANSITION = CONFIG.get('SLIDESHOW', 'transition', fallback='crossfade')
+# Duration of a transition in seconds
+TRANSITION_DURATION = CONFIG.getfloat('SLIDESHOW', 'transition_duration',
+                                      fallback=1.0)
+# Zoom at the end of a slide with the 'kenburns' transition
+KEN_BURNS_ZOOM = CONFIG.getfloat('SLIDESHOW', 'ken_burns_zoom', fallback=1.15)
+# Whether animated GIFs and multi-page TIFFs are played
+ANIMATE = CONFIG.getboolean('SLIDESHOW', 'animate', fallback=True)
+# Daily period like 23:00-07:00 in which the display is blanked
+NIGHT = parse_period(CONFIG.get('SLIDESHOW', 'night', fallback=''))
+# Minutes a tap wakes the display up for during the night
+NIGHT_WAKE = 5
+
+# Performance tuning, optional in the config file
+# Number of upcoming images decoded ahead of time
+PREFETCH_DEPTH = CONFIG.getint('PERFORMANCE', 'prefetch_depth', fallback=2)
+# Number of threads decoding images in the background
+DECODE_WORKERS = CONFIG.getint('PERFORMANCE', 'decode_workers', fallback=1)
+# What happens when the next image is not ready at its time: 'wait' keeps
+# the current image until it is, 'skip' shows a later image that is ready
+LATE_SLIDE = CONFIG.get('PERFORMANCE', 'late_slide', fallback='wait')
+# Seconds a slide may come late without counting as a missed deadline
+LATE_TOLERANCE = 0.05
+# Frame rate while a still image is shown, 0 to always run at full rate
+IDLE_FPS = CONFIG.getfloat('PERFORMANCE', 'idle_fps', fallback=4)
+# Number of frames of an animated image decoded ahead
+ANIMATION_BUFFER = CONFIG.getint('PERFORMANCE', 'animation_buffer', fallback=4)
+# 'display' decodes images at most at screen size, 'full' at native size
+DECODE_MODE = CONFIG.get('PERFORMANCE', 'decode_mode', fallback='display')
+# Directory of all cached data, the subdirectory holding the cache of
+# display-sized images and its size limit in megabytes
+CACHE_DIR = os.path.expanduser(
+    CONFIG.get('PERFORMANCE', 'cache_dir',
+               fallback='~/.cache/slideshow4raspberrypi'))
+IMAGE_CACHE_DIR = join(CACHE_DIR, 'images')
+DISK_CACHE_MB = CONFIG.getint('PERFORMANCE', 'disk_cache_mb', fallback=500)
+# 'auto' times the decoder backends on the library, or the name of a backend
+# of the decoders module used wherever it can
+DECODER = CONFIG.get('PERFORMANCE', 'decoder', fallback='auto')
+DECODER_FILE = join(CACHE_DIR, 'decoders.json')
+# Megabytes of recently shown images kept in memory, which are evicted early
+# while less than MIN_AVAILABLE_MB of memory are available
+MEMORY_CACHE_MB = CONFIG.getfloat('PERFORMANCE', 'memory_cache_mb',
+                                  fallback=128)
+MIN_AVAILABLE_MB = CONFIG.getfloat('PERFORMANCE', 'min_available_mb',
+                                   fallback=100)
+# Seconds between checks of IMG_DIR for new images if inotify is missing
+WATCH_INTERVAL = CONFIG.getfloat('PERFORMANCE', 'watch_interval', fallback=10)
+# Database holding the exif orientation, size and date of every image
+INDEX_FILE = os.path.expanduser(
+    CONFIG.get('PERFORMANCE', 'index_file',
+               fallback=join(CACHE_DIR, 'metadata.sqlite')))
+# JSON lines file metrics are written to every METRICS_LOG_INTERVAL seconds,
+# empty to disable, and its size limit in megabytes
+METRICS_LOG = os.path.expanduser(CONFIG.get('PERFORMANCE', 'metrics_log',
+                                            fallback=''))
+METRICS_LOG_INTERVAL = CONFIG.getfloat('PERFORMANCE', 'metrics_log_interval',
+                                       fallback=60)
+METRICS_LOG_MB = CONFIG.getfloat('PERFORMANCE', 'metrics_log_mb', fallback=1)
+# Port on localhost serving the metrics as JSON over HTTP, 0 to disable
+METRICS_PORT = CONFIG.getint('PERFORMANCE', 'metrics_port', fallback=0)
+# The image shown last and the images shown in the current round, which
+# the next start resumes from, and the listing of the library they refer to.
+# Kept outside IMAGE_CACHE_DIR, so evicting images never touches them
+STATE_FILE = join(CACHE_DIR, 'state.json')
+LIBRARY_FILE = join(CACHE_DIR, 'library')
@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+
+"""
+Interchangeable image decoders for the SlideShow4RaspberryPi project
+
+Every backend turns an image file into a display-ready pixel buffer, like
+helper_func.decode_img. Which backend is fastest depends on the format and
+on the CPU, so DecoderChoice times them on a few images of the library and
+remembers the winner per format.
+"""
+
+
+import json
+import os
+import platform
+import statistics
+import time
+
+from PIL import Image, features
+
+import helper_func as hf
+
+
+class Decoder:
+    """Base class of decoder backends.
+
+    Backends name the file extensions they read in formats. Optional
+    backends override available, so they can be registered even where their
+    library is missing.
+    """
+
+    name = None
+    formats = frozenset()
+
+    def available(self):
+        """Returns whether the backend can be used here.
+
+        :rtype: bool
+        """
+
+        return True
+
+    def decode(self, path, resolution=None,
+               orientation=hf.DEFAULT_ORIENTATION,
+               frame_orientation='landscape'):
+        """Decodes an image, see helper_func.decode_img.
+
+        :return: The pixel data, its size and its colour format
+        :rtype: (bytes, (int, int), str)
+        """
+
+        raise NotImplementedError
+
+
+class PillowDecoder(Decoder):
+    """Decodes images with Pillow at their full size before scaling them.
+    """
+
+    name = 'pillow'
+
+    def __init__(self):
+        """Constructor method
+        """
+
+        formats = set(hf.FORMATS)
+        if features.check('webp'):
+            formats.add('webp')
+        self.formats = frozenset(formats)
+
+    def decode(self, path, resolution=None,
+               orientation=hf.DEFAULT_ORIENTATION,
+               frame_orientation='landscape'):
+        return hf.decode_img(path, resolution, orientation, frame_orientation,
+                             draft=False)
+
+
+class PillowDraftDecoder(Decoder):
+    """Decodes JPEGs with Pillow, letting libjpeg scale them down while
+    decoding.
+    """
+
+    name = 'pillow_draft'
+    formats = frozenset(['jpg', 'jpeg'])
+
+    def decode(self, path, resolution=None,
+               orientation=hf.DEFAULT_ORIENTATION,
+               frame_orientation='landscape'):
+        return hf.decode_img(path, resolution, orientation, frame_orientation)
+
+
+class HeifDecoder(PillowDecoder):
+    """Decodes HEIC images of recent phones through the optional pillow-heif
+    plugin.
+    """
+
+    name = 'pillow_heif'
+    formats = frozenset(['heic', 'heif'])
+
+    def __init__(self):
+        """Constructor method
+        """
+
+        try:
+            import pillow_heif
+        except ImportError:
+            self._available = False
+        else:
+            pillow_heif.register_heif_opener()
+            self._available = True
+
+    def available(self):
+        return self._available
+
+
+class TurboJPEGDecoder(Decoder):
+    """Decodes JPEGs with libjpeg-turbo through the optional PyTurboJPEG
+    binding.
+
+    Like Image.draft, libjpeg-turbo scales images down by a factor while
+    decoding. Its faster colour conversion pays off on larger screens.
+    """
+
+    name = 'turbojpeg'
+    formats = frozenset(['jpg', 'jpeg'])
+
+    def __init__(self):
+        """Constructor method
+        """
+
+        try:
+            from turbojpeg import TJPF_RGB, TurboJPEG
+            self._jpeg = TurboJPEG()
+            self._pixel_format = TJPF_RGB
+        except (ImportError, OSError, RuntimeError):
+            # RuntimeError and OSError if the shared library is missing
+            self._jpeg = None
+
+    def available(self):
+        return self._jpeg is not None
+
+    def decode(self, path, resolution=None,
+               orientation=hf.DEFAULT_ORIENTATION,
+               frame_orientation='landscape'):
+        ops = hf.orientation_ops(orientation, frame_orientation)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        target = None
+        scaling = None
+        if resolution is not None:
+            width, height = self._jpeg.decode_header(data)[:2]
+            if hf.swaps_axes(ops):
+                resolution = resolution[::-1]
+            target = hf.fit_size((width, height), resolution)
+            # The smallest scale still at least as large as the target
+            for num, denom in sorted(self._jpeg.scaling_factors,
+                                     key=lambda f: f[0] / f[1]):
+                if (-(-width * num // denom) >= target[0]
+                        and -(-height * num // denom) >= target[1]):
+                    scaling = (num, denom)
+                    break
+
+        pixels = self._jpeg.decode(data, pixel_format=self._pixel_format,
+                                   scaling_factor=scaling)
+        return hf.render_img(Image.fromarray(pixels), ops, target)
+
+
+class KivyDecoder(Decoder):
+    """Decodes images with the image loader of kivy, usually SDL2_image.
+
+    Only the loader itself is used, which does not touch OpenGL and may run
+    on any thread.
+    """
+
+    name = 'kivy'
+    formats = frozenset(['jpg', 'jpeg', 'png', 'bmp', 'tga'])
+    # Raw modes of Pillow reading kivy's colour formats
+    RAWMODES = {'rgb': ('RGB', 'RGB'), 'rgba': ('RGBA', 'RGBA'),
+                'bgr': ('RGB', 'BGR'), 'bgra': ('RGBA', 'BGRA'),
+                'argb': ('RGBA', 'ARGB'), 'abgr': ('RGBA', 'ABGR')}
+
+    def available(self):
+        try:
+            from kivy.core.image import ImageLoader
+        except Exception:
+            return False
+        return bool(ImageLoader.loaders)
+
+    def decode(self, path, resolution=None,
+               orientation=hf.DEFAULT_ORIENTATION,
+               frame_orientation='landscape'):
+        from kivy.core.image import ImageLoader
+
+        ext = path.rpartition('.')[2].lower()
+        for loader in ImageLoader.loaders:
+            if ext in loader.extensions():
+                break
+        else:
+            raise ValueError("kivy cannot read {}".format(path))
+        # The data is read when the loader is created, textures only later
+        data = loader(path, nocache=True, keep_data=True)._data[0]
+        mode, rawmode = self.RAWMODES[data.fmt]
+        stride = data.rowlength or 0
+        img = Image.frombuffer(mode, (data.width, data.height), data.data,
+                               'raw', rawmode, stride, 1)
+
+        ops = hf.orientation_ops(orientation, frame_orientation)
+        target = None
+        if resolution is not None:
+            if hf.swaps_axes(ops):
+                resolution = resolution[::-1]
+            target = hf.fit_size(img.size, resolution)
+        return hf.render_img(img, ops, target)
+
+
+# Name -> backend, in order of preference before any backend was timed
+BACKENDS = {}
+
+
+def register(backend):
+    """Adds a decoder backend.
+
+    If the backend is available, the formats it reads are shown by the
+    slideshow from now on.
+
+    :param backend: The backend
+    :type backend: decoders.Decoder
+    """
+
+    BACKENDS[backend.name] = backend
+    # Only looked at for new formats, as some backends are slow to check
+    new = backend.formats - hf.FORMATS
+    if new and backend.available():
+        hf.FORMATS.update(new)
+
+
+def available(ext=None):
+    """Returns the available backends.
+
+    :param ext: If given, only backends reading this file extension are
+                returned, defaults to None
+    :type ext: str or None
+
+    :rtype: list
+    """
+
+    return [backend for backend in BACKENDS.values()
+            if (ext is None or ext in backend.formats) and backend.available()]
+
+
+register(PillowDraftDecoder())
+register(PillowDecoder())
+register(HeifDecoder())
+register(TurboJPEGDecoder())
+register(KivyDecoder())
+
+
+def cpu_model():
+    """Returns a description of the CPU, which decides the fastest backend.
+
+    :rtype: str
+    """
+
+    model = platform.machine()
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name.strip() in ('model name', 'Model', 'Hardware'):
+                    model += ' ' + value.strip()
+                    break
+    except OSError:
+        pass
+    return model
+
+
+class DecoderChoice:
+    """Decodes every image with the fastest backend for its format.
+
+    Until backends were timed with select, the first available backend
+    registered for a format is used. Should the chosen backend fail on an
+    image, Pillow decodes it instead.
+
+    :param cache_file: JSON file the choice is kept in between runs,
+                       defaults to None
+    :type cache_file: str or None
+    :param forced: Name of a backend used for every format it reads,
+                   defaults to None
+    :type forced: str or None
+    """
+
+    def __init__(self, cache_file=None, forced=None):
+        """Constructor method
+        """
+
+        self.cache_file = cache_file
+        self.forced = None
+        if forced is not None:
+            self.forced = BACKENDS.get(forced)
+            if self.forced is None or not self.forced.available():
+                print("Decoder {} is not available, choosing one "
+                      "automatically.".format(forced))
+                self.forced = None
+        # Extension -> backend
+        self.choice = {}
+        self._fallback = BACKENDS['pillow']
+
+    def backend(self, ext):
+        """Returns the backend decoding a file extension.
+
+        :param ext: The file extension in lower case
+        :type ext: str
+
+        :rtype: decoders.Decoder
+        """
+
+        backend = self.choice.get(ext)
+        if backend is not None:
+            return backend
+        if self.forced is not None and ext in self.forced.formats:
+            backend = self.forced
+        else:
+            backends = available(ext)
+            backend = backends[0] if backends else self._fallback
+        self.choice[ext] = backend
+        return backend
+
+    def decode(self, path, resolution=None,
+               orientation=hf.DEFAULT_ORIENTATION,
+               frame_orientation='landscape'):
+        """Decodes an image, see helper_func.decode_img.
+
+        :return: The pixel data, its size and its colour format
+        :rtype: (bytes, (int, int), str)
+        """
+
+        backend = self.backend(path.rpartition('.')[2].lower())
+        try:
+            return backend.decode(path, resolution, orientation,
+                                  frame_orientation)
+        except Exception as e:
+            if backend is self._fallback:
+                raise
+            print("{} could not decode {}: {}".format(backend.name, path, e))
+            return self._fallback.decode(path, resolution, orientation,
+                                         frame_orientation)
+
+    def cache_key(self, resolution):
+        """Returns what a cached choice is only valid for.
+
+        :param resolution: The size images are decoded for
+        :type resolution: (int, int) or None
+
+        :rtype: dict
+        """
+
+        return {
+            'cpu': cpu_model(),
+            'backends': sorted(b.name for b in available()),
+            'resolution': list(resolution) if resolution else None,
+            }
+
+    def load(self, resolution):
+        """Takes over the choice of an earlier run.
+
+        :param resolution: The size images are decoded for
+        :type resolution: (int, int) or None
+
+        :return: Whether a choice for this CPU, these backends and this
+                 resolution was found
+        :rtype: bool
+        """
+
+        if self.forced is not None or self.cache_file is None:
+            return self.forced is not None
+        try:
+            with open(self.cache_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if cached.get('key') != self.cache_key(resolution):
+            return False
+        for ext, name in cached.get('choice', {}).items():
+            if name in BACKENDS:
+                self.choice[ext] = BACKENDS[name]
+        return True
+
+    def select(self, paths, resolution, samples=3, repeat=3):
+        """Times every backend on images of the library and keeps the
+        fastest per format.
+
+        Takes a while, so it should run on a background thread.
+
+        :param paths: Paths to images of the library
+        :type paths: iterable
+        :param resolution: The size images are decoded for
+        :type resolution: (int, int) or None
+        :param samples: Number of images timed per format, defaults to 3
+        :type samples: int
+        :param repeat: Number of times every image is decoded, defaults to 3
+        :type repeat: int
+
+        :return: Extension -> name of the chosen backend
+        :rtype: dict
+        """
+
+        by_ext = {}
+        for path in paths:
+            ext = path.rpartition('.')[2].lower()
+            found = by_ext.setdefault(ext, [])
+            if len(found) < samples:
+                found.append(path)
+
+        results = {}
+        for ext, sample in sorted(by_ext.items()):
+            backends = available(ext)
+            if len(backends) < 2:
+                continue
+            # Backend -> path -> seconds, or the exception raised
+            timed = {}
+            for backend in backends:
+                times = timed[backend.name] = {}
+                for path in sample:
+                    try:
+                        times[path] = statistics.median(
+                            self._time(backend, path, resolution)
+                            for _ in range(repeat))
+                    except Exception as e:
+                        times[path] = e
+            # Images no backend reads are damaged and say nothing about the
+            # backends
+            readable = [path for path in sample if any(
+                not isinstance(times[path], Exception)
+                for times in timed.values())]
+            timings = {}
+            for name, times in timed.items():
+                errors = [times[path] for path in readable
+                          if isinstance(times[path], Exception)]
+                if errors:
+                    print("Decoder {} failed on .{} images: {}".format(
+                        name, ext, errors[0]))
+                elif readable:
+                    timings[name] = statistics.median(
+                        times[path] for path in readable)
+            if timings:
+                name = min(timings, key=timings.get)
+                self.choice[ext] = BACKENDS[name]
+                results[ext] = name
+                print("Decoding .{} images with {} ({})".format(
+                    ext, name, ', '.join('{} {:.1f} ms'.format(n, t * 1000)
+                                         for n, t in sorted(timings.items()))))
+
+        self._save(resolution, results)
+        return results
+
+    def _time(self, backend, path, resolution):
+        start = time.perf_counter()
+        backend.decode(path, resolution)
+        return time.perf_counter() - start
+
+    def _save(self, resolution, results):
+        if self.cache_file is None:
+            return
+        cached = {'key': self.cache_key(resolution), 'choice': results}
+        tmp = self.cache_file + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(cached, f, indent=1)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            print("Could not store the choice of decoders:", e)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+Detection of duplicate images for the SlideShow4RaspberryPi project
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+import os
+import sqlite3
+import threading
+
+
+# Bytes read from the start of a file for the partial hash
+PARTIAL_BYTES = 64 * 1024
+CHUNK_BYTES = 1024 * 1024
+
+
+def file_hash(path, limit=None):
+    """Returns the hash of the contents of a file.
+
+    :param path: The path to the file
+    :type path: str
+    :param limit: Only hashes this many bytes from the start of the file,
+                  defaults to None meaning all of it
+    :type limit: int or None
+
+    :rtype: bytes
+    """
+
+    digest = blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        if limit is not None:
+            digest.update(f.read(limit))
+        else:
+            for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+                digest.update(chunk)
+    return digest.digest()
+
+
+class DedupIndex:
+    """Finds images with identical contents, such as the same photo exported
+    from several phones under different names.
+
+    Only files of equal size can be identical. Of those, the first
+    kilobytes are hashed, and only files that still match are hashed in
+    full. Most images are therefore never read at all. Hashes are computed
+    by several threads, as reading dominates, and kept in a SQLite table
+    keyed by path, so they are only computed again for changed files.
+
+    :param db_path: The path to the database file, may be shared with
+                    metadata.MetadataIndex
+    :type db_path: str
+    :param workers: Number of threads hashing files, defaults to 4
+    :type workers: int
+    """
+
+    def __init__(self, db_path, workers=4):
+        """Constructor method
+        """
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS hashes ('
+                         'path TEXT PRIMARY KEY, mtime_ns INTEGER, '
+                         'size INTEGER, partial BLOB, full BLOB)')
+        # Path -> [mtime_ns, size, partial, full]
+        self._rows = {row[0]: list(row[1:]) for row in
+                      self._db.execute('SELECT * FROM hashes')}
+
+    def duplicates(self, paths):
+        """Groups images with identical contents.
+
+        :param paths: Paths to all images of the library
+        :type paths: iterable
+
+        :return: Every image that duplicates another one, mapped to the image
+                 kept in its place. The kept image is the first of a group
+                 in sorted order, so the choice is the same on every run
+        :rtype: dict
+        """
+
+        by_size = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            by_size.setdefault(st.st_size, []).append((path, st))
+
+        candidates = [group for group in by_size.values() if len(group) > 1]
+        if not candidates:
+            return {}
+
+        # Path -> row of the hashes computed now
+        changed = {}
+        partial = self._group(candidates, 'partial', changed)
+        full = self._group([group for group in partial.values()
+                            if len(group) > 1], 'full', changed)
+        self._store(changed)
+
+        found = {}
+        for group in full.values():
+            if len(group) < 2:
+                continue
+            kept, *others = sorted(path for path, _ in group)
+            for path in others:
+                found[path] = kept
+        return found
+
+    def forget(self, path):
+        """Removes the hashes of an image.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        if self._rows.pop(path, None) is None:
+            return
+        with self._lock:
+            self._db.execute('DELETE FROM hashes WHERE path = ?', (path,))
+            self._db.commit()
+
+    def _group(self, groups, kind, changed):
+        """Splits groups of (path, stat) by the partial or full hash."""
+
+        def hashed(item):
+            path, st = item
+            row = self._rows.get(path)
+            if (row is None or row[0] != st.st_mtime_ns
+                    or row[1] != st.st_size):
+                row = self._rows[path] = [st.st_mtime_ns, st.st_size, None,
+                                          None]
+            column = 2 if kind == 'partial' else 3
+            if row[column] is None:
+                if kind == 'full' and st.st_size <= PARTIAL_BYTES:
+                    # The partial hash covered the whole file already
+                    row[column] = row[2]
+                else:
+                    limit = PARTIAL_BYTES if kind == 'partial' else None
+                    try:
+                        row[column] = file_hash(path, limit)
+                    except OSError as e:
+                        print("Could not hash {}: {}".format(path, e))
+                        return item, None
+                changed[path] = row
+            return item, row[column]
+
+        items = [item for group in groups for item in group]
+        split = {}
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='dedup') as pool:
+            for item, digest in pool.map(hashed, items):
+                if digest is None:
+                    continue
+                split.setdefault((item[1].st_size, digest), []).append(item)
+        return split
+
+    def _store(self, changed):
+        if not changed:
+            return
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO hashes '
+                                 'VALUES (?, ?, ?, ?, ?)',
+                                 [(path,) + tuple(row) for path, row in
+                                  changed.items()])
+            self._db.commit()
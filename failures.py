@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+"""
+Registry of unreadable images for the SlideShow4RaspberryPi project
+"""
+
+
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+
+# What Pillow and the other decoders raise on damaged or unsupported files
+READ_ERRORS = (OSError, SyntaxError, Image.DecompressionBombError)
+
+
+class UnreadableImage(Exception):
+    """Raised when an image itself could not be decoded or identified, as
+    opposed to errors that are not the fault of the image.
+    """
+
+
+@contextmanager
+def decoding():
+    """Turns the errors a decoder raises on a bad image into
+    UnreadableImage, for the code around a decoder call.
+    """
+
+    try:
+        yield
+    except READ_ERRORS as e:
+        raise UnreadableImage(str(e) or type(e).__name__) from e
+
+
+class FailureRegistry:
+    """Remembers images that could not be read, so they are not tried again
+    every time they come up.
+
+    Failures are kept in a SQLite table keyed by path together with the
+    modification time and size of the file at the time. A file that changed
+    since, e.g. because an interrupted sync completed, counts as not failed
+    and is tried again.
+
+    :param db_path: The path to the database file, may be shared with
+                    metadata.MetadataIndex
+    :type db_path: str
+    """
+
+    def __init__(self, db_path):
+        """Constructor method
+        """
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # Failures are recorded by the decoding and scanning threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS failures ('
+                         'path TEXT PRIMARY KEY, mtime_ns INTEGER, '
+                         'size INTEGER, error TEXT, failed_at REAL)')
+        # Path -> (mtime_ns, size, error)
+        self._rows = {row[0]: row[1:4] for row in self._db.execute(
+            'SELECT path, mtime_ns, size, error FROM failures')}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, path, error):
+        """Records that an image could not be read.
+
+        :param path: The path to the image
+        :type path: str
+        :param error: What went wrong
+        :type error: Exception or str
+
+        :return: False if the image does not exist anymore, which is not
+                 recorded
+        :rtype: bool
+        """
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        error = str(error) or type(error).__name__
+        with self._lock:
+            self._rows[path] = (st.st_mtime_ns, st.st_size, error)
+            self._db.execute('INSERT OR REPLACE INTO failures '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (path, st.st_mtime_ns, st.st_size, error,
+                              time.time()))
+            self._db.commit()
+        return True
+
+    def is_failed(self, path):
+        """Returns whether an image failed before and is unchanged since.
+
+        Only images with a recorded failure are looked at on disk, so this
+        is cheap for all others. Failures of changed or deleted images are
+        forgotten.
+
+        :param path: The path to the image
+        :type path: str
+
+        :rtype: bool
+        """
+
+        row = self._rows.get(path)
+        if row is None:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.forget(path)
+            return False
+        if (st.st_mtime_ns, st.st_size) != row[:2]:
+            self.forget(path)
+            return False
+        return True
+
+    def error(self, path):
+        """Returns the error recorded for an image.
+
+        :param path: The path to the image
+        :type path: str
+
+        :rtype: str or None
+        """
+
+        row = self._rows.get(path)
+        return row[2] if row is not None else None
+
+    def forget(self, path):
+        """Drops the failure of an image.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        with self._lock:
+            if self._rows.pop(path, None) is None:
+                return
+            self._db.execute('DELETE FROM failures WHERE path = ?', (path,))
+            self._db.commit()
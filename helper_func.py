@@ -5,14 +5,41 @@ A set of helper functions for the SlideShow4RaspberryPi project
 """
 
 
+from fnmatch import fnmatch
+import os
 from os import listdir
 
 from PIL import Image
 from PIL.ExifTags import TAGS
 
 
-FORMATS = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'pcx', 'tga', 'tif', 'lbm',
-           'pbm', 'pgm', 'ppm', 'xpm']
+# Exif tag ids, see PIL.ExifTags.TAGS
+EXIF_ORIENTATION = 0x0112
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+
+# Used when an image carries no orientation in its exif data, i.e. upright
+DEFAULT_ORIENTATION = 1
+
+# Pillow transpose operations turning an image with the given exif
+# orientation upright. Orientations 5 to 8 swap width and height.
+# Reference:
+# https://www.daveperrett.com/articles/2012/07/28/exif-orientation-handling-is-a-ghetto/
+EXIF_TRANSPOSE = {
+    2: (Image.Transpose.FLIP_LEFT_RIGHT,),
+    3: (Image.Transpose.ROTATE_180,),
+    4: (Image.Transpose.FLIP_TOP_BOTTOM,),
+    5: (Image.Transpose.TRANSPOSE,),
+    6: (Image.Transpose.ROTATE_270,),
+    7: (Image.Transpose.TRANSVERSE,),
+    8: (Image.Transpose.ROTATE_90,),
+}
+
+# Extensions of the images shown. Decoder backends registered with
+# decoders.register add the formats they read, such as webp or heic
+FORMATS = set(['jpg', 'jpeg', 'png', 'gif', 'bmp', 'pcx', 'tga', 'tif', 'lbm',
+               'pbm', 'pgm', 'ppm', 'xpm'])
 
 
 def list_img_paths(cpath):
@@ -25,7 +52,174 @@ def list_img_paths(cpath):
     :rtype: list
     """
 
-    return [i for i in listdir(cpath) if i.split('.')[-1].lower() in FORMATS]
+    return [i for i in listdir(cpath)
+            if i.rpartition('.')[2].lower() in FORMATS]
+
+
+def iter_img_paths(cpath, recursive=True, include=(), exclude=(),
+                   on_directory=None):
+    """Yields the absolute paths of all images below the path directory.
+
+    Directories are walked depth first with os.scandir, so the first image
+    is available right away, no matter how large the tree is. Hidden files
+    and directories are skipped. Symlinked directories are followed, but
+    every directory is only walked once, so links pointing back up the tree
+    cause neither loops nor duplicates.
+
+    Patterns are matched with fnmatch against the path relative to cpath,
+    e.g. '2020/*' or '*.png'. Excluded directories are not entered at all.
+
+    :param cpath: Directory path to images
+    :type cpath: str
+    :param recursive: Whether to descend into subdirectories, defaults to True
+    :type recursive: bool
+    :param include: If not empty, only images matching one of these patterns
+                    are yielded, defaults to ()
+    :type include: iterable
+    :param exclude: Images and directories matching one of these patterns are
+                    skipped, defaults to ()
+    :type exclude: iterable
+    :param on_directory: Called with the path of every directory walked
+                         before it is listed, defaults to None
+    :type on_directory: callable or None
+
+    :return: Generator of absolute image paths
+    :rtype: generator
+    """
+
+    root = os.path.join(os.path.abspath(cpath), '')
+    include = tuple(include)
+    exclude = tuple(exclude)
+    stack = [root]
+    # (st_dev, st_ino) of the directories walked
+    visited = set()
+    while stack:
+        path = stack.pop()
+        try:
+            st = os.stat(path)
+            if (st.st_dev, st.st_ino) in visited:
+                continue
+            visited.add((st.st_dev, st.st_ino))
+            if on_directory is not None:
+                on_directory(path)
+            it = os.scandir(path)
+        except OSError as e:
+            print("Could not list {}: {}".format(e.filename, e.strerror))
+            continue
+
+        with it:
+            subdirs = []
+            for entry in it:
+                name = entry.name
+                if name.startswith('.'):
+                    continue
+                rel = entry.path[len(root):]
+                if exclude and any(fnmatch(rel, p) for p in exclude):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+
+                if is_dir:
+                    if recursive:
+                        subdirs.append(entry.path)
+                elif name.rpartition('.')[2].lower() in FORMATS:
+                    if not include or any(fnmatch(rel, p) for p in include):
+                        yield entry.path
+        # Reversed, so subdirectories are visited in listing order
+        stack.extend(reversed(subdirs))
+
+
+def in_library(path, cpath, recursive=True, include=(), exclude=()):
+    """Returns whether iter_img_paths would yield a path, without walking the
+    directory.
+
+    :param path: Absolute path to an image
+    :type path: str
+    :param cpath: Directory path to images
+    :type cpath: str
+    :param recursive: See iter_img_paths, defaults to True
+    :type recursive: bool
+    :param include: See iter_img_paths, defaults to ()
+    :type include: iterable
+    :param exclude: See iter_img_paths, defaults to ()
+    :type exclude: iterable
+
+    :rtype: bool
+    """
+
+    root = os.path.join(os.path.abspath(cpath), '')
+    if not path.startswith(root) or not os.path.isfile(path):
+        return False
+    return is_library_member(path[len(root):], recursive, include, exclude,
+                             sep=os.sep)
+
+
+def is_library_dir(rel, recursive=True, exclude=(), sep='/'):
+    """Returns whether iter_img_paths enters a directory, judging by its path
+    relative to the library only.
+
+    :param rel: Path of the directory relative to the library, '' for the
+                library itself
+    :type rel: str
+    :param recursive: See iter_img_paths, defaults to True
+    :type recursive: bool
+    :param exclude: See iter_img_paths, defaults to ()
+    :type exclude: iterable
+    :param sep: The separator of directories in rel, defaults to '/'
+    :type sep: str
+
+    :rtype: bool
+    """
+
+    if not rel:
+        return True
+    if not recursive:
+        return False
+    parts = rel.split(sep)
+    for i, part in enumerate(parts, 1):
+        if part.startswith('.'):
+            return False
+        # The directory or one of the directories above it
+        sub = sep.join(parts[:i])
+        if any(fnmatch(sub, p) for p in exclude):
+            return False
+    return True
+
+
+def is_library_member(rel, recursive=True, include=(), exclude=(), sep='/'):
+    """Returns whether an image belongs to the images shown, judging by its
+    path relative to the library only.
+
+    Applies the same rules as iter_img_paths, so images in an excluded
+    directory do not belong to it either.
+
+    :param rel: Path of the image relative to the library
+    :type rel: str
+    :param recursive: See iter_img_paths, defaults to True
+    :type recursive: bool
+    :param include: See iter_img_paths, defaults to ()
+    :type include: iterable
+    :param exclude: See iter_img_paths, defaults to ()
+    :type exclude: iterable
+    :param sep: The separator of directories in rel, defaults to '/'
+    :type sep: str
+
+    :rtype: bool
+    """
+
+    directory, _, name = rel.rpartition(sep)
+    if not is_library_dir(directory, recursive, exclude, sep):
+        return False
+    if name.startswith('.'):
+        return False
+    if name.rpartition('.')[2].lower() not in FORMATS:
+        return False
+    if any(fnmatch(rel, p) for p in exclude):
+        return False
+    include = tuple(include)
+    return not include or any(fnmatch(rel, p) for p in include)
 
 
 def aspect_scale(img_dim, resolution):
@@ -90,6 +284,167 @@ def center_img(img_dim, resolution):
     return (w, h)
 
 
+def fit_size(img_dim, resolution):
+    """Returns the size an image is decoded to so that it fits the display.
+
+    Unlike aspect_scale, images smaller than the display are left as is, as
+    enlarging them is left to the GPU.
+
+    :param img_dim: Dimensions of an image
+    :type img_dim: (int, int)
+    :param resolution: The resolution of the display
+    :type resolution: (int, int)
+
+    :return: Dimensions not exceeding the resolution with the image's aspect
+             ratio
+    :rtype: (int, int)
+    """
+
+    ix, iy = img_dim
+    bx, by = resolution
+    if ix <= bx and iy <= by:
+        return img_dim
+    sx, sy = aspect_scale(img_dim, resolution)
+    return (max(sx, 1), max(sy, 1))
+
+
+def orientation_ops(orientation, frame_orientation='landscape'):
+    """Returns the transpose operations that show an image upright on the
+    frame.
+
+    On a frame in portrait orientation, the screen is turned clockwise, so
+    images are additionally turned counterclockwise.
+
+    :param orientation: The exif orientation of the image
+    :type orientation: int
+    :param frame_orientation: 'landscape' or 'portrait', defaults to
+                              'landscape'
+    :type frame_orientation: str
+
+    :return: Pillow transpose operations in the order they are applied
+    :rtype: tuple
+    """
+
+    ops = EXIF_TRANSPOSE.get(orientation, ())
+    if frame_orientation == 'portrait':
+        ops += (Image.Transpose.ROTATE_90,)
+    elif frame_orientation != 'landscape':
+        raise ValueError("No valid frame orientation was given. Did you "
+                         "check spelling?")
+    return ops
+
+
+def swaps_axes(ops):
+    """Returns whether transpose operations swap width and height.
+
+    :param ops: Pillow transpose operations
+    :type ops: tuple
+
+    :rtype: bool
+    """
+
+    turns = (Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270,
+             Image.Transpose.TRANSPOSE, Image.Transpose.TRANSVERSE)
+    return sum(op in turns for op in ops) % 2 == 1
+
+
+def decode_img(fname, resolution=None, orientation=DEFAULT_ORIENTATION,
+               frame_orientation='landscape', draft=True):
+    """Decodes an image into a raw pixel buffer using the Pillow library
+
+    Meant to be run off the main thread, so that only the texture upload is
+    left to kivy when the image is shown.
+
+    If a resolution is given, the image is scaled down to fit it while
+    decoding. JPEGs are decoded at reduced size by libjpeg itself through
+    Image.draft, unless draft is False. Other formats are reduced by an
+    integer factor with Image.reduce before the final resampling.
+
+    The image is turned upright according to its exif orientation and the
+    frame orientation, see orientation_ops. As this happens after scaling,
+    it only costs a copy of the display-sized image.
+
+    :param fname: The path and filename to an image file
+    :type fname: str
+    :param resolution: The size the image is displayed at, defaults to None
+                       meaning native resolution
+    :type resolution: (int, int) or None
+    :param orientation: The exif orientation of the image, defaults to
+                        DEFAULT_ORIENTATION
+    :type orientation: int
+    :param frame_orientation: 'landscape' or 'portrait', defaults to
+                              'landscape'
+    :type frame_orientation: str
+    :param draft: Whether JPEGs are scaled down by libjpeg, defaults to True
+    :type draft: bool
+
+    :return: The pixel data, its width and height and the colour format
+             ('rgb' or 'rgba') as understood by kivy.graphics.texture
+    :rtype: (bytes, (int, int), str)
+    """
+
+    ops = orientation_ops(orientation, frame_orientation)
+    with Image.open(fname) as img:
+        target = None
+        if resolution is not None:
+            # The fit is worked out in the image's own, unturned axes
+            if swaps_axes(ops):
+                resolution = resolution[::-1]
+            target = fit_size(img.size, resolution)
+            if target == img.size:
+                target = None
+
+        if draft and target is not None and img.format == 'JPEG':
+            img.draft('RGB', target)
+
+        return render_img(img, ops, target)
+
+
+def render_img(img, ops, target=None, mode=None):
+    """Converts, scales and turns an opened image into a raw pixel buffer.
+
+    Shared by decode_img and the frames of animated images, see
+    animation.FrameStream.
+
+    :param img: The image, already loaded or drafted
+    :type img: PIL.Image.Image
+    :param ops: Transpose operations as returned by orientation_ops
+    :type ops: tuple
+    :param target: The size the image is scaled to before it is turned,
+                   defaults to None meaning its own size
+    :type target: (int, int) or None
+    :param mode: 'RGB' or 'RGBA' to force a colour format, defaults to None
+                 meaning the one fitting the image
+    :type mode: str or None
+
+    :return: The pixel data, its width and height and the colour format
+    :rtype: (bytes, (int, int), str)
+    """
+
+    if mode is None:
+        if img.mode in ('RGB', 'RGBA'):
+            mode = img.mode
+        elif 'A' in img.getbands() or 'transparency' in img.info:
+            mode = 'RGBA'
+        else:
+            mode = 'RGB'
+    if img.mode != mode:
+        img = img.convert(mode)
+    else:
+        img.load()
+
+    if target is not None and img.size != target:
+        factor = min(img.size[0] // target[0], img.size[1] // target[1])
+        if factor > 1:
+            img = img.reduce(factor)
+        img = img.resize(target, Image.BILINEAR)
+
+    for op in ops:
+        img = img.transpose(op)
+
+    return img.tobytes(), img.size, img.mode.lower()
+
+
 def print_img_exif(fname):
     """Prints a dict of Exif values from an image using Pillow library
 
@@ -142,9 +497,9 @@ def get_img_orientation(fname):
                 if k in TAGS
             }
         return exif["Orientation"]
-    except AttributeError:
-        print("No exif tags found. Using standard landscape orientation...")
-        return 6
+    except (AttributeError, KeyError):
+        print("No exif orientation found. Showing the image as is...")
+        return DEFAULT_ORIENTATION
 
 def get_img_size(fname):
     """Returns image size of an image using the Pillow library
@@ -160,6 +515,31 @@ def get_img_size(fname):
         width, height = img.size
     return width, height
 
+
+def read_img_metadata(fname):
+    """Reads the orientation, size and capture date of an image in one pass
+
+    Only the requested exif tags are looked up, the image data itself is not
+    decoded. Missing orientations default to the same value as in
+    get_img_orientation.
+
+    :param fname: The path and filename to an image file
+    :type fname: str
+
+    :return: exif orientation, width, height and capture date in exif format
+             ('YYYY:MM:DD HH:MM:SS') or None if unknown
+    :rtype: (int, int, int, str or None)
+    """
+
+    with Image.open(fname) as img:
+        width, height = img.size
+        exif = img.getexif()
+        orientation = exif.get(EXIF_ORIENTATION) or DEFAULT_ORIENTATION
+        taken = (exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL)
+                 or exif.get(EXIF_DATETIME))
+    return orientation, width, height, taken
+
+
 if __name__ == "__main__":
     #get_img_orientation("20190330_134242.jpg")
     #print("\n\n#############################\n\n")
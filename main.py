@@ -5,17 +5,24 @@ Basic Image Slideshow for use on a raspberry Pi as a digital picture
 frame (version {}).
 """
 
+import time
+# Taken first, so --startup-time includes all imports
+STARTED = time.monotonic()
+
 import argparse
-import configparser as cp
 import os
 import sys
 
-from app import *
+import config
+from config import *
+# Registers the formats read by optional decoder backends
+import decoders
+import helper_func as hf
+from archive import is_archive
+from pack import is_pack
 
 __version__ = '1.0'
 
-CONFIGFILE = 'settings.conf'
-
 def check_dir(dirpath):
 	"""
 	Checks if valid directory is passed to argparser.
@@ -23,38 +30,52 @@ def check_dir(dirpath):
 	Source: https://stackoverflow.com/questions/11415570/directory-path-types-with-argparse
 	"""
 	
-	if os.path.isdir(dirpath):
+	if os.path.isdir(dirpath) or is_pack(dirpath) or is_archive(dirpath):
 		return dirpath
 	else:
 		raise argparse.ArgumentTypeError("{0} is not a valid path".format(dirpath))
 
-def save_settings_externally(configs, configfile=CONFIGFILE):
-	
-	config = cp.ConfigParser()
-	config.read(configfile)
+def parse_resolution(value):
+	"""Checks if a valid resolution like 1920x1080 is passed to argparser."""
 
-	config['SLIDESHOW']['frame_orientation'] = configs['frame_orientation']
-	config['SLIDESHOW']['img_dir'] = configs['img_dir']
-	config['SLIDESHOW']['time_delay'] = str(configs['time_delay'])
-	
-	global FRAME_ORIENTATION
-	FRAME_ORIENTATION = configs['frame_orientation']
-	global IMG_DIR
-	IMG_DIR = configs['img_dir']
-	global TIME_DELAY
-	TIME_DELAY = configs['time_delay']
-	
-	# Save all values to file
-	with open(configfile, 'w') as conf:
-		config.write(conf)
+	try:
+		width, height = (int(v) for v in value.lower().split('x'))
+	except ValueError:
+		raise argparse.ArgumentTypeError("{0} is not a valid resolution".format(value))
+	if width <= 0 or height <= 0:
+		raise argparse.ArgumentTypeError("{0} is not a valid resolution".format(value))
+	return width, height
+
+def save_settings_externally(configs, configfile=CONFIGFILE):
+	"""Applies the settings given on the command line and keeps them for the
+	next start."""
+
+	values = {
+		'frame_orientation': configs['frame_orientation'],
+		'img_dir': configs['img_dir'],
+		'time_delay': str(configs['time_delay']),
+		}
+	changed = False
+	for key, value in values.items():
+		if CONFIG['SLIDESHOW'].get(key) != value:
+			CONFIG['SLIDESHOW'][key] = value
+			changed = True
+
+	# The app takes these from the config module once it is imported
+	config.FRAME_ORIENTATION = values['frame_orientation']
+	config.IMG_DIR = values['img_dir']
+	config.TIME_DELAY = values['time_delay']
+
+	# Save all values to file, which is skipped on the usual start without
+	# arguments to spare the SD card
+	if changed:
+		with open(configfile, 'w') as conf:
+			CONFIG.write(conf)
 
 
 def parse_arguments(argv):
 	"""Setup argument parser for command line arguments."""
-	
-	config = cp.ConfigParser()
-	config.read(CONFIGFILE)
-	
+
 	parser = argparse.ArgumentParser(description=__doc__.format(__version__))
 
 	# Settings arguments
@@ -74,7 +95,9 @@ def parse_arguments(argv):
 						type=check_dir,
 						metavar='IMG_DIR',
 						help=('Defines the path to the folder with the '
-						'images to be displayed by the slideshow app.')
+						'images to be displayed by the slideshow app, to a '
+						'zip or tar archive of images, or to a pack file made '
+						'by the prepare command.')
 						)
 	parser.add_argument('--time_delay', '-t',
 						dest='time_delay',
@@ -95,14 +118,135 @@ def parse_arguments(argv):
 						'menu, otherwise it goes directly to the slideshow.')
 						)
 
+	parser.add_argument('--startup-time',
+						dest='startup_time',
+						action='store_true',
+						help=('Prints how long it took until the first image '
+						'was shown and quits.')
+						)
+
+	# Commands run instead of the slideshow
+	subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+	subparsers.add_parser('index',
+						help=('Builds or updates the metadata index of all '
+						'images in IMG_DIR and exits.')
+						)
+	prepare = subparsers.add_parser('prepare',
+						help=('Writes display-ready copies of all images in '
+						'IMG_DIR to DESTINATION and exits. DESTINATION can be '
+						'used as IMG_DIR afterwards.')
+						)
+	prepare.add_argument('destination',
+						metavar='DESTINATION',
+						help=('The folder the prepared images are written to, '
+						'or the pack file with --format pack.')
+						)
+	prepare.add_argument('--format', '-f',
+						dest='format',
+						default='jpeg',
+						choices=('jpeg', 'pack'),
+						help=('jpeg writes a folder of images, pack a single '
+						'file of decoded images, which is shown without any '
+						'decoding but takes more space.')
+						)
+	prepare.add_argument('--resolution', '-r',
+						dest='resolution',
+						default='1920x1080',
+						type=parse_resolution,
+						metavar='WIDTHxHEIGHT',
+						help=('The resolution of the display in landscape '
+						'orientation, defaults to 1920x1080.')
+						)
+	prepare.add_argument('--workers', '-w',
+						dest='workers',
+						default=None,
+						type=int,
+						metavar='WORKERS',
+						help=('Number of images prepared in parallel, '
+						'defaults to the number of CPU cores.')
+						)
+	prepare.add_argument('--quality', '-q',
+						dest='quality',
+						default=90,
+						type=int,
+						metavar='QUALITY',
+						help='JPEG quality of the prepared images.'
+						)
+
 	return vars(parser.parse_args(argv))
 
+def build_index(img_dir):
+	"""Brings the metadata index of all images in img_dir up to date."""
+
+	from failures import FailureRegistry
+	from metadata import MetadataIndex
+
+	if is_pack(img_dir):
+		print("{} is a pack file, which needs no index.".format(img_dir))
+		return
+	if is_archive(img_dir):
+		print("{} is an archive, which needs no index.".format(img_dir))
+		return
+
+	paths = list(hf.iter_img_paths(img_dir, recursive=RECURSIVE,
+								   include=INCLUDE, exclude=EXCLUDE))
+	# Unreadable images are recorded and skipped like in the slideshow
+	failures = FailureRegistry(INDEX_FILE)
+	failed = {path for path in paths if failures.is_failed(path)}
+
+	def image_failed(path, error):
+		failures.add(path, error)
+		failed.add(path)
+
+	index = MetadataIndex(INDEX_FILE, on_error=image_failed)
+	read = index.update([p for p in paths if p not in failed], root=img_dir)
+	print("Indexed {} images in {} ({} read, {} up to date, {} failed).".format(
+		len(paths), img_dir, read, len(paths) - read - len(failed), len(failed)))
+
+	if DEDUP:
+		from dedup import DedupIndex
+
+		duplicates = DedupIndex(INDEX_FILE).duplicates(
+			[p for p in paths if p not in failed])
+		print("Found {} duplicate images.".format(len(duplicates)))
+
+def prepare_library(img_dir, destination, resolution, frame_orientation,
+					workers, quality, format='jpeg'):
+	"""Writes display-ready copies of all images in img_dir to destination."""
+
+	import prepare
+
+	if format == 'pack':
+		done, skipped, failed = prepare.prepare_pack(
+			img_dir, destination, resolution, frame_orientation,
+			workers=workers, recursive=RECURSIVE, include=INCLUDE,
+			exclude=EXCLUDE)
+	else:
+		done, skipped, failed = prepare.prepare_library(
+			img_dir, destination, resolution, frame_orientation,
+			workers=workers, quality=quality, recursive=RECURSIVE,
+			include=INCLUDE, exclude=EXCLUDE)
+	print("Prepared {} images in {} ({} up to date, {} failed).".format(
+		done, destination, skipped, failed))
+
 def cli(argv=None):
     """CLI entry point."""
     kwargs = parse_arguments(argv or sys.argv[1:])
+    if kwargs['command'] == 'index':
+        return build_index(kwargs['img_dir'])
+    if kwargs['command'] == 'prepare':
+        return prepare_library(kwargs['img_dir'], kwargs['destination'],
+                               kwargs['resolution'],
+                               kwargs['frame_orientation'], kwargs['workers'],
+                               kwargs['quality'], kwargs['format'])
+
     save_settings_externally(kwargs)
-    
-    slideshow = SlideShowApp(kwargs['menu_start'])
+
+    # Imported only now, as kivy takes a while to load and opens the window
+    from app import SlideShowApp
+
+    started = STARTED if kwargs['startup_time'] else None
+    slideshow = SlideShowApp(kwargs['menu_start'], started=started)
     slideshow.run()
     slideshow.root.menu.update_vars()
 
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+"""
+Persistent index of image metadata for the SlideShow4RaspberryPi project
+"""
+
+
+from collections import namedtuple
+import os
+import sqlite3
+import threading
+
+from failures import UnreadableImage, decoding
+import helper_func as hf
+
+
+# Increased whenever the meaning of stored values changes, which rebuilds
+# existing indexes
+SCHEMA_VERSION = 1
+
+ImgMeta = namedtuple('ImgMeta', ['mtime_ns', 'size', 'orientation', 'width',
+                                 'height', 'taken'])
+
+
+class MetadataIndex:
+    """Stores orientation, dimensions and capture date of every image in a
+    SQLite database, so the slideshow never has to parse exif data while
+    showing images.
+
+    All rows are held in memory as well, which makes a lookup a single dict
+    access. Rows are keyed by absolute path and only re-read when the
+    modification time or size of a file changed.
+
+    :param db_path: The path to the database file
+    :type db_path: str
+    :param on_error: Called with the path and a failures.UnreadableImage
+                     for images that cannot be read, defaults to None
+    :type on_error: callable or None
+    """
+
+    def __init__(self, db_path, on_error=None):
+        """Constructor method
+        """
+
+        self.on_error = on_error
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Lookups and updates come from the decoding and scanning threads
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._db.execute('DROP TABLE IF EXISTS images')
+            self._db.execute('PRAGMA user_version = {:d}'
+                             .format(SCHEMA_VERSION))
+        self._db.execute('CREATE TABLE IF NOT EXISTS images ('
+                         'path TEXT PRIMARY KEY, mtime_ns INTEGER, '
+                         'size INTEGER, orientation INTEGER, width INTEGER, '
+                         'height INTEGER, taken TEXT)')
+        self._rows = {row[0]: ImgMeta(*row[1:]) for row in
+                      self._db.execute('SELECT * FROM images')}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, path):
+        """Returns the indexed metadata of an image without touching the file.
+
+        :param path: The path to the image
+        :type path: str
+
+        :return: The metadata or None if the image is not indexed
+        :rtype: metadata.ImgMeta or None
+        """
+
+        return self._rows.get(os.path.abspath(path))
+
+    def orientation(self, path):
+        """Returns the exif orientation of an image.
+
+        Images missing from the index are read and added to it. If that
+        fails, the default orientation of helper_func is returned.
+
+        :param path: The path to the image
+        :type path: str
+
+        :rtype: int
+        """
+
+        meta = self.get(path)
+        if meta is None:
+            self.update([path])
+            meta = self.get(path)
+            if meta is None:
+                return hf.DEFAULT_ORIENTATION
+        return meta.orientation
+
+    def update(self, paths, root=None):
+        """Adds new and changed images to the index.
+
+        :param paths: Paths to all images to be indexed
+        :type paths: iterable
+        :param root: If given, images below this directory that are not in
+                     paths are removed from the index, defaults to None
+        :type root: str or None
+
+        :return: Number of images that had to be read
+        :rtype: int
+        """
+
+        seen = set()
+        changed = []
+        read = 0
+        for path in paths:
+            path = os.path.abspath(path)
+            seen.add(path)
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                print("Could not index {}: {}".format(path, e))
+                continue
+            meta = self._rows.get(path)
+            if (meta is not None and meta.mtime_ns == st.st_mtime_ns
+                    and meta.size == st.st_size):
+                continue
+            try:
+                with decoding():
+                    meta = ImgMeta(st.st_mtime_ns, st.st_size,
+                                   *hf.read_img_metadata(path))
+            except UnreadableImage as e:
+                print("Could not index {}: {}".format(path, e))
+                if self.on_error is not None:
+                    self.on_error(path, e)
+                continue
+            except Exception as e:
+                # E.g. exif data Pillow cannot make sense of
+                print("Could not index {}: {}".format(path, e))
+                continue
+
+            self._rows[path] = meta
+            changed.append((path,) + meta)
+            read += 1
+            if len(changed) >= 500:
+                self._store(changed)
+                changed = []
+        self._store(changed)
+
+        if root is not None:
+            prefix = os.path.join(os.path.abspath(root), '')
+            gone = [p for p in list(self._rows)
+                    if p.startswith(prefix) and p not in seen]
+            for path in gone:
+                del self._rows[path]
+            with self._lock:
+                self._db.executemany('DELETE FROM images WHERE path = ?',
+                                     [(p,) for p in gone])
+                self._db.commit()
+
+        return read
+
+    def remove(self, path):
+        """Removes an image from the index.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        path = os.path.abspath(path)
+        self._rows.pop(path, None)
+        with self._lock:
+            self._db.execute('DELETE FROM images WHERE path = ?', (path,))
+            self._db.commit()
+
+    def _store(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO images '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._db.commit()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""
+Performance metrics of the SlideShow4RaspberryPi project
+"""
+
+
+from collections import deque
+from contextlib import contextmanager
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+
+def rss_bytes():
+    """Returns the resident memory of this process.
+
+    :return: Resident memory in bytes or None if it is not known
+    :rtype: int or None
+    """
+
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Histogram:
+    """Keeps the latest samples of a timing for percentiles.
+
+    :param size: Number of samples kept, defaults to 500
+    :type size: int
+    """
+
+    def __init__(self, size=500):
+        """Constructor method
+        """
+
+        self.count = 0
+        self._samples = deque(maxlen=size)
+
+    def add(self, value):
+        """Records a sample.
+
+        :param value: The sample
+        :type value: float
+        """
+
+        self.count += 1
+        self._samples.append(value)
+
+    def summary(self, scale=1000):
+        """Returns count, mean, percentiles and maximum of the kept samples.
+
+        :param scale: Factor applied to the samples, defaults to 1000 turning
+                      seconds into milliseconds
+        :type scale: float
+
+        :rtype: dict
+        """
+
+        samples = sorted(self._samples)
+        if not samples:
+            return {'count': self.count}
+
+        def pick(q):
+            return round(samples[min(int(q * len(samples)),
+                                     len(samples) - 1)] * scale, 3)
+
+        return {
+            'count': self.count,
+            'mean': round(sum(samples) / len(samples) * scale, 3),
+            'p50': pick(0.5),
+            'p90': pick(0.9),
+            'p99': pick(0.99),
+            'max': round(samples[-1] * scale, 3),
+            }
+
+
+class Metrics:
+    """Collects timings, counters and gauges of the slideshow.
+
+    Timings go into rolling histograms and are reported in milliseconds.
+    Values owned by other parts, such as cache statistics, are read through
+    providers only when a snapshot is taken. All methods may be called from
+    any thread.
+    """
+
+    def __init__(self):
+        """Constructor method
+        """
+
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._counters = {}
+        # Name -> callable returning a value for the snapshot
+        self._providers = {}
+
+    def record(self, name, seconds):
+        """Records a timing.
+
+        :param name: The name of the timing
+        :type name: str
+        :param seconds: The duration in seconds
+        :type seconds: float
+        """
+
+        with self._lock:
+            histogram = self._timings.get(name)
+            if histogram is None:
+                histogram = self._timings[name] = Histogram()
+            histogram.add(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Records the duration of a with block as a timing.
+
+        :param name: The name of the timing
+        :type name: str
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        """Increases a counter.
+
+        :param name: The name of the counter
+        :type name: str
+        :param n: The amount to add, defaults to 1
+        :type n: int
+        """
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def provide(self, name, func):
+        """Adds a value read whenever a snapshot is taken.
+
+        :param name: The name of the value in the snapshot
+        :type name: str
+        :param func: Returns the value, which must be serializable as JSON
+        :type func: callable
+        """
+
+        self._providers[name] = func
+
+    def snapshot(self):
+        """Returns all metrics.
+
+        :rtype: dict
+        """
+
+        with self._lock:
+            timings = {name: histogram.summary()
+                       for name, histogram in self._timings.items()}
+            counters = dict(self._counters)
+
+        snapshot = {
+            'time': round(time.time(), 3),
+            'uptime_s': round(time.time() - self.started, 1),
+            'rss_mb': None,
+            'timings_ms': timings,
+            'counters': counters,
+            }
+        rss = rss_bytes()
+        if rss is not None:
+            snapshot['rss_mb'] = round(rss / 1024 ** 2, 1)
+        for name, func in list(self._providers.items()):
+            try:
+                snapshot[name] = func()
+            except Exception as e:
+                snapshot[name] = 'error: {}'.format(e)
+        return snapshot
+
+
+class MetricsLog:
+    """Appends a snapshot of the metrics to a JSON lines file at a fixed
+    interval, from a background thread.
+
+    The file is rotated once it reaches its size limit, keeping one older
+    file.
+
+    :param metrics: The metrics to log
+    :type metrics: metrics.Metrics
+    :param path: The path to the log file
+    :type path: str
+    :param interval: Seconds between two snapshots, defaults to 60
+    :type interval: float
+    :param max_mb: Size limit of the log file in megabytes, defaults to 1
+    :type max_mb: float
+    """
+
+    def __init__(self, metrics, path, interval=60, max_mb=1):
+        """Constructor method
+        """
+
+        self.metrics = metrics
+        self.interval = interval
+
+        log_dir = os.path.dirname(path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=int(max_mb * 1024 * 1024), backupCount=1)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._logger = logging.getLogger('slideshow.metrics')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(handler)
+        self._handler = handler
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='metrics-log')
+
+    def start(self):
+        """Starts logging.
+        """
+
+        self._thread.start()
+
+    def stop(self):
+        """Writes a last snapshot and stops logging.
+        """
+
+        self._stop.set()
+        self._thread.join()
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+
+    def write(self):
+        """Writes a snapshot now.
+        """
+
+        self._logger.info(json.dumps(self.metrics.snapshot(),
+                                     separators=(',', ':')))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+        self.write()
+
+
+class MetricsServer:
+    """Serves the metrics as JSON over HTTP, so they can be collected from a
+    frame without a display attached.
+
+    Only GET requests are answered, on every path. By default the server
+    only listens on localhost.
+
+    :param metrics: The metrics to serve
+    :type metrics: metrics.Metrics
+    :param port: The TCP port to listen on
+    :type port: int
+    :param host: The address to listen on, defaults to '127.0.0.1'
+    :type host: str
+    """
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        """Constructor method
+        """
+
+        # Only imported when metrics are served, as it slows down the start
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = json.dumps(metrics.snapshot(), indent=1).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True, name='metrics-http')
+
+    @property
+    def port(self):
+        """The port the server listens on."""
+
+        return self._server.server_address[1]
+
+    def start(self):
+        """Starts serving in a background thread.
+        """
+
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving.
+        """
+
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def format_overlay(snapshot):
+    """Returns the lines shown by the on-screen overlay.
+
+    :param snapshot: As returned by Metrics.snapshot
+    :type snapshot: dict
+
+    :rtype: str
+    """
+
+    lines = ['{:.0f} fps   {} MB RSS   up {:.0f} s'.format(
+        snapshot.get('fps', 0), snapshot.get('rss_mb'),
+        snapshot.get('uptime_s', 0))]
+    for name, timing in sorted(snapshot.get('timings_ms', {}).items()):
+        if 'p50' in timing:
+            lines.append('{:<16} p50 {:>8.1f}  p99 {:>8.1f}  max {:>8.1f} ms'
+                         '  n={}'.format(name, timing['p50'], timing['p99'],
+                                         timing['max'], timing['count']))
+    for name in ('memory_cache', 'disk_cache'):
+        stats = snapshot.get(name)
+        if isinstance(stats, dict):
+            lines.append('{:<16} {:.0%} hits of {}'.format(
+                name, stats['hit_rate'], stats['hits'] + stats['misses']))
+    for name, value in sorted(snapshot.get('counters', {}).items()):
+        lines.append('{:<16} {}'.format(name, value))
+    return '\n'.join(lines)
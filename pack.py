@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+"""
+Pack files of pre-decoded images for the SlideShow4RaspberryPi project
+
+A pack holds display-ready frames as raw RGB(A) pixels, so showing an image
+needs neither decoding nor copying: the frame is mapped into memory and its
+buffer handed to the texture as it is. Layout, all numbers little endian:
+
+* Header: magic, version, frame orientation, resolution, number of frames
+  and offset of the index
+* Frames: raw pixels, rows top to bottom, each aligned to a memory page
+* Index: offset, size of the original, dimensions and name of every frame
+"""
+
+
+import mmap
+import os
+import struct
+
+from PIL import Image as PILImage
+
+
+MAGIC = b'SSPK'
+VERSION = 1
+# magic, version, portrait, width, height, count, index offset
+HEADER = struct.Struct('<4sHBxIIIQ')
+# offset, mtime_ns and size of the original, width, height, channels, length
+# of the name following the entry
+ENTRY = struct.Struct('<QqQIIBxH')
+ALIGN = mmap.PAGESIZE
+COLORFMTS = {3: 'rgb', 4: 'rgba'}
+
+
+def is_pack(path):
+    """Returns whether a path points to a pack file.
+
+    :param path: The path to check
+    :type path: str
+
+    :rtype: bool
+    """
+
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class PackWriter:
+    """Writes frames to a new pack file.
+
+    The pack is written next to its final location and only moved there by
+    close, so readers never see a half written pack.
+
+    :param path: The path to the pack file
+    :type path: str
+    :param resolution: The resolution the frames were fitted to
+    :type resolution: (int, int)
+    :param frame_orientation: 'landscape' or 'portrait', the frames are
+                              turned for it
+    :type frame_orientation: str
+    """
+
+    def __init__(self, path, resolution, frame_orientation):
+        """Constructor method
+        """
+
+        self.path = path
+        self.resolution = tuple(resolution)
+        self.frame_orientation = frame_orientation
+        self._entries = []
+        self._file = open(path + '.tmp', 'wb')
+        self._file.write(b'\0' * HEADER.size)
+
+    def add(self, name, pixels, size, colorfmt, mtime_ns=0, src_size=0):
+        """Appends a frame.
+
+        :param name: The name of the frame, usually the path of the original
+                     relative to the library
+        :type name: str
+        :param pixels: The pixel data as returned by helper_func.decode_img
+        :type pixels: bytes-like
+        :param size: Width and height of the frame
+        :type size: (int, int)
+        :param colorfmt: 'rgb' or 'rgba'
+        :type colorfmt: str
+        :param mtime_ns: Modification time of the original, defaults to 0
+        :type mtime_ns: int
+        :param src_size: Size in bytes of the original, defaults to 0
+        :type src_size: int
+        """
+
+        offset = -self._file.tell() % ALIGN + self._file.tell()
+        self._file.seek(offset)
+        self._file.write(pixels)
+        self._entries.append((name, offset, mtime_ns, src_size, size[0],
+                              size[1], len(colorfmt)))
+
+    def close(self):
+        """Writes the index and moves the pack to its final location.
+        """
+
+        index_offset = self._file.tell()
+        for name, *entry in self._entries:
+            encoded = name.encode('utf-8')
+            self._file.write(ENTRY.pack(*entry, len(encoded)))
+            self._file.write(encoded)
+
+        self._file.seek(0)
+        self._file.write(HEADER.pack(
+            MAGIC, VERSION, self.frame_orientation == 'portrait',
+            self.resolution[0], self.resolution[1], len(self._entries),
+            index_offset))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        """Discards the pack written so far.
+        """
+
+        self._file.close()
+        os.remove(self.path + '.tmp')
+
+
+class PackFile:
+    """Reads frames from a pack file without copying them.
+
+    The file is mapped into memory once. Frames are returned as memoryviews
+    into the mapping, which can be given to Texture.blit_buffer directly.
+
+    :param path: The path to the pack file
+    :type path: str
+    """
+
+    def __init__(self, path):
+        """Constructor method
+        """
+
+        self.path = path
+        with open(path, 'rb') as f:
+            # Texture.blit_buffer only takes writable buffers. A private
+            # mapping is writable without copying anything, as nothing is
+            # ever written to it
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._view = memoryview(self._mmap)
+
+        (magic, version, portrait, width, height, count,
+         offset) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a pack file of version {}."
+                             .format(path, VERSION))
+        self.frame_orientation = 'portrait' if portrait else 'landscape'
+        self.resolution = (width, height)
+
+        # Name -> (offset, mtime_ns, src_size, width, height, channels)
+        self.entries = {}
+        for _ in range(count):
+            *entry, length = ENTRY.unpack_from(self._mmap, offset)
+            offset += ENTRY.size
+            name = bytes(self._mmap[offset:offset + length]).decode('utf-8')
+            offset += length
+            self.entries[name] = tuple(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def names(self):
+        """Returns the names of all frames in the order they were added.
+
+        :rtype: list
+        """
+
+        return list(self.entries)
+
+    def frame(self, name):
+        """Returns a frame as stored in the pack.
+
+        :param name: The name of the frame
+        :type name: str
+
+        :return: The pixel data, its size and its colour format
+        :rtype: (memoryview, (int, int), str)
+        """
+
+        offset, _, _, width, height, channels = self.entries[name]
+        length = width * height * channels
+        if hasattr(self._mmap, 'madvise'):
+            # Reads the frame from disk now rather than page by page while
+            # it is uploaded
+            self._mmap.madvise(mmap.MADV_WILLNEED, offset, length)
+        return (self._view[offset:offset + length], (width, height),
+                COLORFMTS[channels])
+
+    def load(self, name, resolution=None, frame_orientation=None):
+        """Returns a frame ready to be shown in a frame.
+
+        Frames are returned without copying them, unless the pack was made
+        for the other frame orientation and they have to be turned.
+
+        :param name: The name of the frame
+        :type name: str
+        :param resolution: Ignored, frames have the size of the pack,
+                           defaults to None
+        :type resolution: (int, int) or None
+        :param frame_orientation: 'landscape' or 'portrait', defaults to None
+                                  meaning the one of the pack
+        :type frame_orientation: str or None
+
+        :return: The pixel data, its size and its colour format
+        :rtype: (bytes-like, (int, int), str)
+        """
+
+        pixels, size, colorfmt = self.frame(name)
+        if frame_orientation in (None, self.frame_orientation):
+            return pixels, size, colorfmt
+
+        mode = colorfmt.upper()
+        img = PILImage.frombuffer(mode, size, pixels, 'raw', mode, 0, 1)
+        if frame_orientation == 'portrait':
+            img = img.transpose(PILImage.Transpose.ROTATE_90)
+        else:
+            img = img.transpose(PILImage.Transpose.ROTATE_270)
+        return img.tobytes(), img.size, colorfmt
+
+    def close(self):
+        """Unmaps the file.
+
+        Frames still referenced elsewhere keep the mapping alive until they
+        are released.
+        """
+
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            pass
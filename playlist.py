@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+
+"""
+Order in which images are shown for the SlideShow4RaspberryPi project
+"""
+
+
+from array import array
+from bisect import bisect_left
+import sys
+import random
+
+
+class Playlist:
+    """Decides which image is shown next.
+
+    Every image is shown once per round before any image is repeated. The
+    order of a round depends on the mode:
+
+    * 'shuffle': a random permutation
+    * 'sequential': the order in which the images were added
+    * 'weighted': a random permutation in which images with a higher weight
+      tend to come earlier
+
+    Images added during a round are placed at a random position among the
+    images not shown yet, or at the end in 'sequential' mode.
+
+    Paths are stored once in a table and the order is kept as an array of
+    indices into it, so large libraries are cheap to reshuffle. Removed
+    paths leave a gap in the table, which is closed once gaps make up half
+    of it. The images shown in the current round are marked in a bitmap
+    over the same table, which is cleared when the order reaches the next
+    round.
+
+    :param mode: One of Playlist.MODES, defaults to 'shuffle'
+    :type mode: str
+    :param seed: Seed of the random order, defaults to None
+    :type seed: int or None
+    :param weight: Function returning a positive weight for a path, only
+                   used in 'weighted' mode, defaults to None
+    :type weight: callable or None
+    """
+
+    MODES = ('shuffle', 'sequential', 'weighted')
+
+    def __init__(self, mode='shuffle', seed=None, weight=None):
+        """Constructor method
+        """
+
+        if mode not in self.MODES:
+            raise ValueError("Unknown playlist mode {!r}. Choose one of {}."
+                             .format(mode, ', '.join(self.MODES)))
+        if mode == 'weighted' and weight is None:
+            raise ValueError("The weighted playlist mode needs a weight "
+                             "function.")
+
+        self.mode = mode
+        self.weight = weight
+        self._rng = random.Random(seed)
+
+        # Index -> path, None for removed paths
+        self._paths = []
+        # Path -> index
+        self._ids = {}
+        # Indices in the order they are shown, possibly spanning rounds
+        self._order = array('L')
+        # Position of the next image in self._order
+        self._pos = 0
+        # Number of positions after self._pos handed out by peek, which must
+        # not be reordered anymore
+        self._peeked = 0
+        # Index of the image shown last
+        self._last = None
+        # Positions in self._order at which the rounds appended by _extend
+        # start, ascending
+        self._rounds = []
+        # Bit per index, set for the images shown in the current round
+        self._shown = bytearray()
+        self._shown_count = 0
+        # Increased whenever images are added or removed
+        self.version = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, path):
+        return path in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def add(self, path):
+        """Adds an image to the current round.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        if path in self._ids:
+            return
+        idx = len(self._paths)
+        path = sys.intern(path)
+        self._paths.append(path)
+        self._ids[path] = idx
+        self.version += 1
+
+        self._order.append(idx)
+        if self.mode != 'sequential':
+            # One step of an inside-out shuffle keeps the rest of the round
+            # uniformly shuffled without touching the other entries
+            start = self._pos + self._peeked
+            end = len(self._order) - 1
+            if end > start:
+                j = self._rng.randint(start, end)
+                self._order[j], self._order[end] = (self._order[end],
+                                                    self._order[j])
+
+    def add_many(self, paths):
+        """Adds several images to the current round.
+
+        :param paths: The paths to the images
+        :type paths: iterable
+        """
+
+        for path in paths:
+            self.add(path)
+
+    def remove(self, path):
+        """Removes an image.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        idx = self._ids.pop(path, None)
+        if idx is None:
+            return
+        self._paths[idx] = None
+        self._mark(idx, False)
+        self.version += 1
+        if len(self._ids) * 2 < len(self._paths):
+            self._compact()
+
+    def clear(self):
+        """Removes all images.
+        """
+
+        self._paths = []
+        self._ids = {}
+        self._order = array('L')
+        self._pos = 0
+        self._peeked = 0
+        self._last = None
+        self._rounds = []
+        self._shown = bytearray()
+        self._shown_count = 0
+        self.version += 1
+
+    def next(self):
+        """Returns the next image and moves on.
+
+        :return: The path to the image or None if there are no images
+        :rtype: str or None
+        """
+
+        if not self._ids:
+            return None
+        while True:
+            if self._pos >= len(self._order):
+                self._extend()
+            if self._rounds and self._rounds[0] <= self._pos:
+                # A new round starts
+                del self._rounds[0]
+                self._shown = bytearray()
+                self._shown_count = 0
+            idx = self._order[self._pos]
+            self._pos += 1
+            self._peeked = max(self._peeked - 1, 0)
+            path = self._paths[idx]
+            if path is not None:
+                self._last = idx
+                break
+        self._mark(idx, True)
+
+        # Drops the positions already shown once they dominate the order
+        if self._pos > 1024 and self._pos * 2 > len(self._order):
+            del self._order[:self._pos]
+            self._rounds = [start - self._pos for start in self._rounds]
+            self._pos = 0
+        return path
+
+    def peek(self, n):
+        """Returns the next n images without moving on.
+
+        The returned images keep their place in the order. If there are fewer
+        than n images, images of the following round are included.
+
+        :param n: Number of images
+        :type n: int
+
+        :rtype: list
+        """
+
+        if not self._ids:
+            return []
+        found = []
+        i = self._pos
+        while len(found) < n:
+            if i >= len(self._order):
+                self._extend()
+            path = self._paths[self._order[i]]
+            if path is not None:
+                found.append(path)
+            i += 1
+        self._peeked = max(self._peeked, i - self._pos)
+        return found
+
+    def move_up(self, path):
+        """Moves an upcoming image to the front, so it is returned by the
+        next call of next. The image it replaces takes its place.
+
+        :param path: The path to the image, one of those returned by the
+                     latest call of peek
+        :type path: str
+
+        :return: Whether the image was found among the peeked ones
+        :rtype: bool
+        """
+
+        idx = self._ids.get(path)
+        if idx is None:
+            return False
+        front = None
+        for i in range(self._pos, min(self._pos + self._peeked,
+                                      len(self._order))):
+            if self._paths[self._order[i]] is None:
+                continue
+            if front is None:
+                front = i
+            if self._order[i] == idx:
+                self._order[front], self._order[i] = (self._order[i],
+                                                      self._order[front])
+                return True
+        return False
+
+    def shown(self):
+        """Returns the images shown in the current round.
+
+        :rtype: list
+        """
+
+        return [self._paths[idx] for idx in self._shown_indices()]
+
+    def mark_shown(self, paths):
+        """Counts images as shown in the current round, e.g. those shown
+        before a restart, so they are not shown again until the round is
+        over.
+
+        Images handed out by peek lose their place as well, so the upcoming
+        images should be peeked again afterwards.
+
+        :param paths: The paths to the images
+        :type paths: iterable
+
+        :return: Number of images marked
+        :rtype: int
+        """
+
+        marked = set()
+        for path in paths:
+            idx = self._ids.get(path)
+            if idx is None or self._is_shown(idx):
+                continue
+            self._mark(idx, True)
+            marked.add(idx)
+        if not marked:
+            return 0
+        count = len(marked)
+
+        # Each image appears once per round, so its first place after the
+        # current position is its place in the current round
+        order = self._order[:self._pos]
+        peeked = self._peeked
+        dropped = []
+        for i in range(self._pos, len(self._order)):
+            idx = self._order[i]
+            if idx in marked:
+                marked.discard(idx)
+                dropped.append(i)
+                if i < self._pos + self._peeked:
+                    peeked -= 1
+            else:
+                order.append(idx)
+        self._order = order
+        self._peeked = peeked
+        self._rounds = self._shift_rounds(dropped)
+        return count
+
+    def _is_shown(self, idx):
+        byte = idx >> 3
+        return byte < len(self._shown) and bool(self._shown[byte]
+                                                >> (idx & 7) & 1)
+
+    def _mark(self, idx, shown):
+        """Sets or clears the bit of an index in the shown bitmap.
+        """
+
+        if self._is_shown(idx) == shown:
+            return
+        byte = idx >> 3
+        if byte >= len(self._shown):
+            self._shown.extend(bytes(byte + 1 - len(self._shown)))
+        self._shown[byte] ^= 1 << (idx & 7)
+        self._shown_count += 1 if shown else -1
+
+    def _shift_rounds(self, dropped):
+        """Returns the starts of the upcoming rounds once the given positions
+        are dropped from the order.
+
+        :param dropped: The positions dropped, ascending
+        :type dropped: list
+
+        :rtype: list
+        """
+
+        return [start - bisect_left(dropped, start) for start in self._rounds]
+
+    def _shown_indices(self):
+        for byte, bits in enumerate(self._shown):
+            if bits:
+                for bit in range(8):
+                    if bits >> bit & 1:
+                        yield byte << 3 | bit
+
+    def _extend(self):
+        """Appends the order of a new round.
+        """
+
+        order = array('L', self._ids.values())
+        if self.mode == 'shuffle':
+            self._rng.shuffle(order)
+        elif self.mode == 'weighted':
+            # Weighted sampling without replacement (Efraimidis, Spirakis)
+            rnd = self._rng.random
+            paths = self._paths
+            keys = {idx: rnd() ** (1.0 / max(self.weight(paths[idx]), 1e-9))
+                    for idx in order}
+            order = array('L', sorted(order, key=keys.__getitem__,
+                                      reverse=True))
+        else:
+            order = array('L', sorted(order))
+
+        # The image shown right before the new round, skipping removed ones
+        prev = self._last
+        for idx in reversed(self._order):
+            if self._paths[idx] is not None:
+                prev = idx
+                break
+        if len(order) > 1 and order[0] == prev:
+            # Avoids showing the same image twice across the round boundary
+            order[0], order[-1] = order[-1], order[0]
+        self._rounds.append(len(self._order))
+        self._order.extend(order)
+
+    def _compact(self):
+        """Closes the gaps left by removed images in the path table.
+        """
+
+        remap = {}
+        paths = []
+        for idx, path in enumerate(self._paths):
+            if path is not None:
+                remap[idx] = len(paths)
+                paths.append(path)
+        self._paths = paths
+        self._ids = {path: idx for idx, path in enumerate(paths)}
+
+        order = array('L')
+        pos = peeked = 0
+        dropped = []
+        for i, idx in enumerate(self._order):
+            if idx not in remap:
+                dropped.append(i)
+                continue
+            if i < self._pos:
+                pos += 1
+            elif i < self._pos + self._peeked:
+                peeked += 1
+            order.append(remap[idx])
+        self._order = order
+        self._pos = pos
+        self._peeked = peeked
+        self._rounds = self._shift_rounds(dropped)
+        self._last = remap.get(self._last)
+
+        shown = [remap[idx] for idx in self._shown_indices()]
+        self._shown = bytearray()
+        self._shown_count = 0
+        for idx in shown:
+            self._mark(idx, True)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+"""
+Power saving for the SlideShow4RaspberryPi project
+"""
+
+
+import datetime
+import glob
+
+
+class IdleGovernor:
+    """Lowers the frame rate of the kivy clock while nothing on screen moves.
+
+    A still image needs no redraws, but kivy's main loop keeps waking up at
+    its full frame rate. Parts of the app that animate or wait for input mark
+    themselves busy under a reason of their own, and the full frame rate
+    applies as long as any reason is busy. Input and scheduled events are
+    still handled while idle, only up to 1 / idle_fps seconds later.
+
+    :param clock: The kivy clock
+    :type clock: kivy.clock.ClockBase
+    :param idle_fps: Frame rate while idle, 0 disables idle mode, defaults to
+                     4
+    :type idle_fps: float
+    """
+
+    def __init__(self, clock, idle_fps=4):
+        """Constructor method
+        """
+
+        self.clock = clock
+        self.idle_fps = idle_fps
+        # kivy offers no public way to change the frame rate at runtime
+        self.full_fps = clock._max_fps
+        self._busy = set()
+        self._apply()
+
+    @property
+    def lead(self):
+        """Seconds before an event that must be on time to mark busy, as
+        idle ticks come this far apart."""
+
+        return 1 / self.idle_fps + 0.1 if self.idle_fps > 0 else 0
+
+    @property
+    def is_idle(self):
+        """Whether the clock runs at the idle frame rate."""
+
+        return self.idle_fps > 0 and not self._busy
+
+    def busy(self, reason):
+        """Switches to the full frame rate until reason is idle again.
+
+        :param reason: What needs the full frame rate, e.g. 'transition'
+        :type reason: str
+        """
+
+        self._busy.add(reason)
+        self._apply()
+
+    def idle(self, reason):
+        """Drops a reason for the full frame rate.
+
+        :param reason: The reason given to busy
+        :type reason: str
+        """
+
+        self._busy.discard(reason)
+        self._apply()
+
+    def _apply(self):
+        if self.is_idle:
+            self.clock._max_fps = float(self.idle_fps)
+        else:
+            self.clock._max_fps = self.full_fps
+
+
+def parse_period(value):
+    """Parses a daily period like '23:00-07:00'.
+
+    :param value: Start and end time separated by '-', may be empty
+    :type value: str
+
+    :return: Start and end in minutes after midnight, None if value is empty
+    :rtype: (int, int) or None
+    """
+
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        times = [datetime.datetime.strptime(t.strip(), '%H:%M')
+                 for t in value.split('-')]
+        start, end = (t.hour * 60 + t.minute for t in times)
+    except ValueError:
+        raise ValueError("{!r} is not a valid period. Use e.g. 23:00-07:00."
+                         .format(value))
+    return start, end
+
+
+def in_period(period, now=None):
+    """Returns whether a time lies within a daily period.
+
+    Periods may span midnight.
+
+    :param period: As returned by parse_period
+    :type period: (int, int) or None
+    :param now: The time to check, defaults to None meaning now
+    :type now: datetime.datetime or None
+
+    :rtype: bool
+    """
+
+    if period is None:
+        return False
+    now = now or datetime.datetime.now()
+    minute = now.hour * 60 + now.minute
+    start, end = period
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def set_backlight(on):
+    """Switches the backlight of attached displays, such as the official
+    Raspberry Pi touchscreen.
+
+    :param on: Whether the backlight should be on
+    :type on: bool
+
+    :return: Whether a backlight could be switched. Usually needs write access
+             to /sys/class/backlight
+    :rtype: bool
+    """
+
+    switched = False
+    for path in glob.glob('/sys/class/backlight/*/bl_power'):
+        try:
+            with open(path, 'w') as f:
+                f.write('0' if on else '1')
+            switched = True
+        except OSError:
+            pass
+    return switched
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Background decoding of upcoming slides for the SlideShow4RaspberryPi project
+"""
+
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Prefetcher:
+    """Decodes the images that are about to be shown on a pool of worker
+    threads, so that the main thread only has to upload finished pixel
+    buffers to the GPU.
+
+    Pillow releases the GIL while decoding, so threads are sufficient and
+    avoid copying the decoded buffers between processes.
+
+    :param load: Function taking a path and returning the decoded image. It
+                 runs on a worker thread and must not touch any kivy object.
+    :type load: callable
+    :param on_ready: Called from the worker thread with the path and the
+                     result of load once an image is decoded, defaults to None
+    :type on_ready: callable or None
+    :param workers: Number of decoding threads, defaults to 1
+    :type workers: int
+    :param on_error: Called with the path and the exception if load fails,
+                     defaults to None. The exception is raised again by take.
+    :type on_error: callable or None
+    """
+
+    def __init__(self, load, on_ready=None, workers=1, on_error=None):
+        """Constructor method
+        """
+
+        self._load = load
+        self._on_ready = on_ready
+        self._on_error = on_error
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='prefetch')
+        # Path -> Future, in the order the paths were requested
+        self._pending = OrderedDict()
+
+    def request(self, paths):
+        """Schedules the decoding of all paths not already requested.
+
+        :param paths: Paths of the images to be shown next
+        :type paths: iterable
+        """
+
+        for path in paths:
+            if path not in self._pending:
+                self._pending[path] = self._executor.submit(self._run, path)
+
+    def take(self, path):
+        """Returns the decoded image and forgets about it.
+
+        Blocks until decoding is finished. If the image was never requested,
+        it is decoded on the calling thread. If decoding failed, the
+        exception is raised here after it was passed to on_error.
+
+        :param path: The path to the image
+        :type path: str
+
+        :return: The result of the load function
+        """
+
+        future = self._pending.pop(path, None)
+        if future is None:
+            return self._call(path)
+        return future.result()
+
+    def forget(self, path):
+        """Forgets about a request whose result was already handed over
+        through on_ready.
+
+        :param path: The path to the image
+        :type path: str
+        """
+
+        self._pending.pop(path, None)
+
+    def discard(self, keep=()):
+        """Drops every request not listed in keep.
+
+        Decoding that has not started yet is cancelled.
+
+        :param keep: Paths whose requests should be kept, defaults to ()
+        :type keep: iterable
+        """
+
+        keep = set(keep)
+        for path in [p for p in self._pending if p not in keep]:
+            self._pending.pop(path).cancel()
+
+    def shutdown(self):
+        """Cancels all pending work and stops the worker threads.
+        """
+
+        self.discard()
+        self._executor.shutdown(wait=False)
+
+    def _call(self, path):
+        try:
+            return self._load(path)
+        except Exception as e:
+            if self._on_error is not None:
+                self._on_error(path, e)
+            raise
+
+    def _run(self, path):
+        result = self._call(path)
+        if self._on_ready is not None:
+            self._on_ready(path, result)
+        return result
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+
+"""
+Offline preparation of display-ready images for the SlideShow4RaspberryPi
+project
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+
+from PIL import Image
+
+import helper_func as hf
+from pack import PackFile, PackWriter, is_pack
+
+
+MANIFEST = 'manifest.json'
+
+
+def output_name(rel, colorfmt):
+    """Returns the path of a prepared image relative to the output directory.
+
+    JPEGs keep their name, other images get the extension of the format they
+    are stored in appended, so 'a.png' and 'a.jpg' do not collide.
+
+    :param rel: The path of the original relative to the source directory
+    :type rel: str
+    :param colorfmt: 'rgb' or 'rgba'
+    :type colorfmt: str
+
+    :rtype: str
+    """
+
+    ext = rel.rpartition('.')[2].lower()
+    if colorfmt == 'rgba':
+        return rel if ext == 'png' else rel + '.png'
+    return rel if ext in ('jpg', 'jpeg') else rel + '.jpg'
+
+
+def prepare_image(src, dst_dir, rel, resolution, frame_orientation,
+                  quality=90):
+    """Decodes, turns upright, scales down and re-encodes a single image.
+
+    Runs in a worker process. The frame orientation only decides which side
+    of the screen the image is fitted to, the image itself is stored upright,
+    so the slideshow can still turn it for the frame.
+
+    :param src: The path to the original image
+    :type src: str
+    :param dst_dir: The output directory
+    :type dst_dir: str
+    :param rel: The path of the original relative to the source directory
+    :type rel: str
+    :param resolution: The resolution of the display
+    :type resolution: (int, int)
+    :param frame_orientation: 'landscape' or 'portrait'
+    :type frame_orientation: str
+    :param quality: JPEG quality, defaults to 90
+    :type quality: int
+
+    :return: The manifest entry of the prepared image
+    :rtype: dict
+    """
+
+    st = os.stat(src)
+    orientation = hf.read_img_metadata(src)[0]
+    if frame_orientation == 'portrait':
+        resolution = resolution[::-1]
+    pixels, size, colorfmt = hf.decode_img(src, resolution, orientation)
+
+    out = output_name(rel, colorfmt)
+    dst = os.path.join(dst_dir, out)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    img = Image.frombytes(colorfmt.upper(), size, pixels)
+    tmp = dst + '.tmp'
+    if colorfmt == 'rgba':
+        img.save(tmp, 'PNG')
+    else:
+        img.save(tmp, 'JPEG', quality=quality)
+    os.replace(tmp, dst)
+
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'output': out,
+            'width': size[0], 'height': size[1]}
+
+
+def decode_frame(src, resolution, frame_orientation):
+    """Decodes a single image turned and fitted for the frame.
+
+    Runs in a worker process.
+
+    :param src: The path to the original image
+    :type src: str
+    :param resolution: The resolution of the display
+    :type resolution: (int, int)
+    :param frame_orientation: 'landscape' or 'portrait'
+    :type frame_orientation: str
+
+    :return: The pixel data, its size, its colour format and the
+             modification time and size of the original
+    :rtype: (bytes, (int, int), str, int, int)
+    """
+
+    st = os.stat(src)
+    orientation = hf.read_img_metadata(src)[0]
+    return hf.decode_img(src, resolution, orientation, frame_orientation) + (
+        st.st_mtime_ns, st.st_size)
+
+
+def load_manifest(dst_dir):
+    """Returns the manifest of an output directory or an empty one.
+
+    :param dst_dir: The output directory
+    :type dst_dir: str
+
+    :rtype: dict
+    """
+
+    try:
+        with open(os.path.join(dst_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'images': {}}
+
+
+def save_manifest(dst_dir, manifest):
+    """Writes the manifest of an output directory atomically.
+
+    :param dst_dir: The output directory
+    :type dst_dir: str
+    :param manifest: The manifest
+    :type manifest: dict
+    """
+
+    path = os.path.join(dst_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def prepare_library(src_dir, dst_dir, resolution, frame_orientation,
+                    workers=None, quality=90, recursive=True, include=(),
+                    exclude=()):
+    """Prepares display-ready copies of all images in src_dir in parallel.
+
+    The manifest in dst_dir records the modification time and size of every
+    original, so an interrupted run resumes where it stopped and later runs
+    only process new and changed images. Copies of images that disappeared
+    from src_dir are deleted.
+
+    :param src_dir: The directory with the original images
+    :type src_dir: str
+    :param dst_dir: The output directory, which can be used as image
+                    directory of the slideshow afterwards
+    :type dst_dir: str
+    :param resolution: The resolution of the display
+    :type resolution: (int, int)
+    :param frame_orientation: 'landscape' or 'portrait'
+    :type frame_orientation: str
+    :param workers: Number of processes, defaults to None meaning one per
+                    CPU core
+    :type workers: int or None
+    :param quality: JPEG quality, defaults to 90
+    :type quality: int
+    :param recursive: Whether to include subdirectories, defaults to True
+    :type recursive: bool
+    :param include: See helper_func.iter_img_paths, defaults to ()
+    :type include: iterable
+    :param exclude: See helper_func.iter_img_paths, defaults to ()
+    :type exclude: iterable
+
+    :return: Number of prepared, skipped and failed images
+    :rtype: (int, int, int)
+    """
+
+    src_dir = os.path.abspath(src_dir)
+    dst_dir = os.path.abspath(dst_dir)
+    os.makedirs(dst_dir, exist_ok=True)
+
+    manifest = load_manifest(dst_dir)
+    settings = {'resolution': list(resolution),
+                'frame_orientation': frame_orientation}
+    if any(manifest.get(k) != v for k, v in settings.items()):
+        # Everything has to be redone for a different display
+        manifest = dict(settings, images={})
+    images = manifest['images']
+
+    todo = []
+    seen = set()
+    skipped = 0
+    for src in hf.iter_img_paths(src_dir, recursive=recursive,
+                                 include=include, exclude=exclude):
+        if src.startswith(os.path.join(dst_dir, '')):
+            # The output directory may sit inside the source directory
+            continue
+        rel = os.path.relpath(src, src_dir)
+        seen.add(rel)
+        entry = images.get(rel)
+        if entry is not None:
+            st = os.stat(src)
+            if (entry['mtime_ns'] == st.st_mtime_ns
+                    and entry['size'] == st.st_size
+                    and os.path.exists(os.path.join(dst_dir,
+                                                    entry['output']))):
+                skipped += 1
+                continue
+        todo.append((src, rel))
+
+    for rel in [r for r in images if r not in seen]:
+        try:
+            os.remove(os.path.join(dst_dir, images.pop(rel)['output']))
+        except OSError:
+            pass
+
+    print("Preparing {} images, {} are up to date.".format(len(todo),
+                                                            skipped))
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(prepare_image, src, dst_dir, rel,
+                                   tuple(resolution), frame_orientation,
+                                   quality): rel
+                   for src, rel in todo}
+        for future in as_completed(futures):
+            rel = futures[future]
+            try:
+                images[rel] = future.result()
+                done += 1
+            except Exception as e:
+                print("Could not prepare {}: {}".format(rel, e))
+                failed += 1
+            if (done + failed) % 50 == 0:
+                # Progress survives an interruption
+                save_manifest(dst_dir, manifest)
+                print("{} of {} done.".format(done + failed, len(todo)))
+
+    save_manifest(dst_dir, manifest)
+    return done, skipped, failed
+
+
+def prepare_pack(src_dir, pack_path, resolution, frame_orientation,
+                 workers=None, recursive=True, include=(), exclude=()):
+    """Decodes all images in src_dir in parallel into a pack file.
+
+    Frames are turned and fitted for the frame, so the slideshow shows them
+    without any processing, see pack.PackFile. If pack_path already is a pack
+    for the same display, frames of unchanged images are copied from it
+    instead of being decoded again. The pack is replaced only once it is
+    complete.
+
+    :param src_dir: The directory with the original images
+    :type src_dir: str
+    :param pack_path: The path to the pack file, which can be used as image
+                      directory of the slideshow afterwards
+    :type pack_path: str
+    :param resolution: The resolution of the display
+    :type resolution: (int, int)
+    :param frame_orientation: 'landscape' or 'portrait'
+    :type frame_orientation: str
+    :param workers: Number of processes, defaults to None meaning one per
+                    CPU core
+    :type workers: int or None
+    :param recursive: Whether to include subdirectories, defaults to True
+    :type recursive: bool
+    :param include: See helper_func.iter_img_paths, defaults to ()
+    :type include: iterable
+    :param exclude: See helper_func.iter_img_paths, defaults to ()
+    :type exclude: iterable
+
+    :return: Number of decoded, reused and failed images
+    :rtype: (int, int, int)
+    """
+
+    src_dir = os.path.abspath(src_dir)
+    old = None
+    if is_pack(pack_path):
+        old = PackFile(pack_path)
+        if (old.resolution != tuple(resolution)
+                or old.frame_orientation != frame_orientation):
+            old.close()
+            old = None
+
+    todo = []
+    reused = []
+    for src in hf.iter_img_paths(src_dir, recursive=recursive,
+                                 include=include, exclude=exclude):
+        rel = os.path.relpath(src, src_dir)
+        if old is not None and rel in old:
+            st = os.stat(src)
+            _, mtime_ns, size = old.entries[rel][:3]
+            if mtime_ns == st.st_mtime_ns and size == st.st_size:
+                reused.append(rel)
+                continue
+        todo.append((src, rel))
+
+    print("Packing {} images, {} are up to date.".format(len(todo),
+                                                         len(reused)))
+    dst_dir = os.path.dirname(os.path.abspath(pack_path))
+    os.makedirs(dst_dir, exist_ok=True)
+    writer = PackWriter(pack_path, resolution, frame_orientation)
+    try:
+        for rel in reused:
+            _, mtime_ns, size = old.entries[rel][:3]
+            writer.add(rel, *old.frame(rel), mtime_ns=mtime_ns,
+                       src_size=size)
+        if old is not None:
+            old.close()
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(decode_frame, src, tuple(resolution),
+                                       frame_orientation): rel
+                       for src, rel in todo}
+            for future in as_completed(futures):
+                rel = futures.pop(future)
+                try:
+                    pixels, size, colorfmt, mtime_ns, src_size = \
+                        future.result()
+                except Exception as e:
+                    print("Could not pack {}: {}".format(rel, e))
+                    failed += 1
+                    continue
+                writer.add(rel, pixels, size, colorfmt, mtime_ns=mtime_ns,
+                           src_size=src_size)
+                done += 1
+                if done % 50 == 0:
+                    print("{} of {} done.".format(done + failed, len(todo)))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return done, len(reused), failed
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+"""
+Playback state kept across restarts for the SlideShow4RaspberryPi project
+"""
+
+
+import base64
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+import json
+import os
+import zlib
+
+
+# Increased whenever the format of the state file changes
+STATE_VERSION = 1
+
+
+def write_atomic(path, data):
+    """Replaces a file such that a power cut leaves either its old or its new
+    contents, never a mix of both.
+
+    :param path: The path to the file
+    :type path: str
+    :param data: The new contents
+    :type data: bytes
+    """
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # The rename only survives a power cut once the directory is synced
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def library_digest(data):
+    """Returns the hash of a library listing as stored in the state file.
+
+    :param data: The contents of the listing file
+    :type data: bytes
+
+    :rtype: str
+    """
+
+    return blake2b(data, digest_size=16).hexdigest()
+
+
+class PlaybackState:
+    """Keeps the image on screen and the images shown in the current round
+    of the playlist across restarts, including power cuts.
+
+    Two files are written. The listing holds the sorted paths of the
+    library and is only rewritten when the library changed. The state file
+    is small: the image on screen, the number of images shown in the round
+    and a bitmap with one bit per line of the listing, set for the images
+    shown. Both are replaced atomically, see write_atomic. Writes happen on
+    a background thread, and callers are expected to save at most every
+    minute or so to spare the SD card.
+
+    :param state_file: The path to the state file
+    :type state_file: str
+    :param library_file: The path to the listing of the library
+    :type library_file: str
+    """
+
+    def __init__(self, state_file, library_file):
+        """Constructor method
+        """
+
+        self.state_file = state_file
+        self.library_file = library_file
+        # The state read by load
+        self._saved = None
+        # Playlist.version the listing was written for, its sorted paths and
+        # the hash of its contents
+        self._version = None
+        self._listing = []
+        self._digest = None
+        self._writer = ThreadPoolExecutor(max_workers=1,
+                                          thread_name_prefix='state')
+
+    def load(self, img_dir):
+        """Reads the state stored for an image directory.
+
+        Only the small state file is read, see shown for the rest.
+
+        :param img_dir: The image directory, pack or archive shown
+        :type img_dir: str
+
+        :return: The image on screen when the state was saved, or None if no
+                 state was saved for img_dir
+        :rtype: str or None
+        """
+
+        self._saved = None
+        try:
+            with open(self.state_file, 'rb') as f:
+                state = json.loads(f.read().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print("Could not read the playback state, starting a new round:",
+                  e)
+            return None
+        if (not isinstance(state, dict)
+                or state.get('version') != STATE_VERSION):
+            print("Ignoring a playback state of another version.")
+            return None
+        if state.get('img_dir') != os.path.abspath(img_dir):
+            return None
+        self._saved = state
+        # Spares rewriting the listing if the library did not change
+        self._digest = state.get('library')
+        return state.get('slide')
+
+    def shown(self):
+        """Returns the images shown in the round the loaded state was saved
+        in.
+
+        Reads the listing of the library, so it is best called from a
+        background thread.
+
+        :return: The paths to the images, empty if the state or the listing
+                 are missing or damaged
+        :rtype: set
+        """
+
+        state = self._saved
+        if state is None:
+            return set()
+        # Until the listing is found intact, the next save writes it again
+        digest, self._digest = self._digest, None
+        try:
+            with open(self.library_file, 'rb') as f:
+                data = f.read()
+            bits = zlib.decompress(base64.b64decode(state['shown']))
+        except (OSError, KeyError, TypeError, ValueError, zlib.error) as e:
+            print("Could not read the playback state, starting a new round:",
+                  e)
+            return set()
+        if library_digest(data) != state.get('library'):
+            print("The listing of the library does not match the playback "
+                  "state, starting a new round.")
+            return set()
+
+        paths = data.decode('utf-8', 'surrogateescape').split('\0')
+        shown = set()
+        for byte, value in enumerate(bits):
+            for bit in range(8):
+                if value >> bit & 1 and byte << 3 | bit < len(paths):
+                    shown.add(paths[byte << 3 | bit])
+        if len(shown) != state.get('position'):
+            print("The playback state is damaged, starting a new round.")
+            return set()
+        self._digest = digest
+        return shown
+
+    def save(self, img_dir, slide, playlist, wait=False):
+        """Stores the image on screen and the images shown in the current
+        round.
+
+        :param img_dir: The image directory, pack or archive shown
+        :type img_dir: str
+        :param slide: The path to the image on screen
+        :type slide: str
+        :param playlist: The playlist
+        :type playlist: playlist.Playlist
+        :param wait: Whether to wait until the files are written, e.g. when
+                     the app stops, defaults to False
+        :type wait: bool
+        """
+
+        paths = None
+        if playlist.version != self._version:
+            self._version = playlist.version
+            paths = list(playlist)
+        task = self._writer.submit(self._write, os.path.abspath(img_dir),
+                                   slide, paths, playlist.shown())
+        if wait:
+            task.result()
+
+    def _write(self, img_dir, slide, paths, shown):
+        try:
+            if paths is not None:
+                paths.sort()
+                data = '\0'.join(paths).encode('utf-8', 'surrogateescape')
+                digest = library_digest(data)
+                if digest != self._digest:
+                    self._digest = None
+                    write_atomic(self.library_file, data)
+                    self._digest = digest
+                self._listing = paths
+
+            listing = self._listing
+            bits = bytearray((len(listing) + 7) // 8)
+            position = 0
+            for path in shown:
+                i = bisect_left(listing, path)
+                if i < len(listing) and listing[i] == path:
+                    bits[i >> 3] |= 1 << (i & 7)
+                    position += 1
+            state = {
+                'version': STATE_VERSION,
+                'img_dir': img_dir,
+                'slide': slide,
+                'library': self._digest,
+                'position': position,
+                'shown': base64.b64encode(zlib.compress(bytes(bits))).decode(),
+                }
+            write_atomic(self.state_file, json.dumps(state).encode('utf-8'))
+        except OSError as e:
+            # Writes the listing again next time
+            self._version = None
+            print("Could not store the playback state:", e)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Tests of the playlist of the SlideShow4RaspberryPi project
+"""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist import Playlist
+
+
+class TestShown(unittest.TestCase):
+    """The images marked as shown follow the rounds of the order.
+    """
+
+    def test_startup(self):
+        # On startup the last image is shown before the library is scanned
+        playlist = Playlist(seed=1)
+        paths = ['p{}'.format(i) for i in range(10)]
+        playlist.add(paths[0])
+        playlist.next()
+        playlist.add_many(paths)
+
+        first = [playlist.next() for _ in range(9)]
+        self.assertEqual(sorted(first + [paths[0]]), paths)
+        self.assertEqual(sorted(playlist.shown()), paths)
+
+        second = [playlist.next() for _ in range(3)]
+        self.assertEqual(sorted(playlist.shown()), sorted(second))
+
+    def test_rounds(self):
+        for seed in range(20):
+            playlist = Playlist(seed=seed)
+            playlist.add('p0')
+            playlist.next()
+            playlist.add_many('p{}'.format(i) for i in range(7))
+            playlist.remove('p3')
+            playlist.peek(12)
+            # Images shown before a restart
+            playlist.mark_shown(['p1', 'p2'])
+            shown = {'p0', 'p1', 'p2'}
+            for _ in range(40):
+                if len(shown) == len(playlist):
+                    shown = set()
+                path = playlist.next()
+                self.assertNotIn(path, shown)
+                shown.add(path)
+                self.assertEqual(set(playlist.shown()), shown)
+
+
+
+class TestOrder(unittest.TestCase):
+    """The order across rounds.
+    """
+
+    def test_no_repeat_after_removal(self):
+        # The last image of a round was removed, e.g. a failed image
+        for seed in range(50):
+            playlist = Playlist(seed=seed)
+            playlist.add_many('p{}'.format(i) for i in range(5))
+            shown = [playlist.next() for _ in range(3)]
+            playlist.remove(playlist.peek(2)[-1])
+            shown += [playlist.next() for _ in range(30)]
+            for before, after in zip(shown, shown[1:]):
+                self.assertNotEqual(before, after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+
+"""
+Watches the image directory for changes for the SlideShow4RaspberryPi project
+"""
+
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+import helper_func as hf
+
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_ADDED = IN_CLOSE_WRITE | IN_MOVED_TO
+IN_REMOVED = IN_DELETE | IN_MOVED_FROM
+IN_WATCHED = (IN_ADDED | IN_REMOVED | IN_CREATE | IN_DELETE_SELF
+              | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """Returns the C library if it provides inotify, otherwise None.
+    """
+
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class DirectoryWatcher:
+    """Reports images added to or removed from a directory tree while the
+    slideshow runs.
+
+    The images already there are taken from the library scan, see scan, so
+    the tree is only walked once. Uses inotify where available, with one
+    watch per directory, so only the changed files are looked at. Otherwise
+    every directory is polled, which lists it only when its modification
+    time changed. Renames are reported as a removal of the old and an
+    addition of the new name, and directories moved in or out as the
+    addition or removal of all images within.
+
+    Only images iter_img_paths of helper_func would find are reported, with
+    the same recursive, include and exclude settings. Both callbacks are
+    called with the absolute path from the watcher's thread.
+
+    :param path: The directory to watch
+    :type path: str
+    :param on_added: Called with the path of every new image
+    :type on_added: callable
+    :param on_removed: Called with the path of every removed image
+    :type on_removed: callable
+    :param poll_interval: Seconds between two checks when polling, defaults
+                          to 10
+    :type poll_interval: float
+    :param recursive: Whether subdirectories are watched, defaults to True
+    :type recursive: bool
+    :param include: See helper_func.iter_img_paths, defaults to ()
+    :type include: iterable
+    :param exclude: See helper_func.iter_img_paths, defaults to ()
+    :type exclude: iterable
+    """
+
+    def __init__(self, path, on_added, on_removed, poll_interval=10,
+                 recursive=True, include=(), exclude=()):
+        """Constructor method
+        """
+
+        self.path = os.path.abspath(path)
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.poll_interval = poll_interval
+        self.recursive = recursive
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+
+        # Directory relative to self.path, '' for the directory itself ->
+        # names of the images in it as last reported
+        self._known = {}
+        # Guards the state below, shared by the scan and the watcher's thread
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._fd = -1
+        self._libc = None
+        # Watch descriptor -> directory relative to self.path
+        self._watches = {}
+        # When polling, directory relative to self.path -> (st_dev, st_ino,
+        # st_mtime_ns) when it was last listed, and (st_dev, st_ino) ->
+        # directory
+        self._dirs = {}
+        self._inodes = {}
+        # Pipe waking up the inotify thread when stopping
+        self._wake = None
+
+    def start(self):
+        """Starts watching in a background thread.
+
+        Images already in the tree are only known once they were passed on
+        by scan.
+        """
+
+        libc = _load_inotify()
+        if libc is not None:
+            self._fd = libc.inotify_init1(os.O_CLOEXEC)
+            if self._fd >= 0:
+                self._libc = libc
+                if not self._add_dir(''):
+                    os.close(self._fd)
+                    self._fd = -1
+
+        if self._fd >= 0:
+            self._wake = os.pipe()
+            target = self._watch_inotify
+        else:
+            print("inotify is not available. Polling {} every {} seconds "
+                  "instead.".format(self.path, self.poll_interval))
+            self._add_dir('')
+            target = self._watch_polling
+
+        self._thread = threading.Thread(target=target, daemon=True,
+                                        name='watcher')
+        self._thread.start()
+
+    def stop(self):
+        """Stops watching and waits for the background thread to end.
+        """
+
+        self._stop.set()
+        if self._wake is not None:
+            os.write(self._wake[1], b'\0')
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._wake is not None:
+            for fd in self._wake:
+                os.close(fd)
+            self._wake = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._watches = {}
+
+    def scan(self):
+        """Yields the images in the tree like helper_func.iter_img_paths and
+        watches every directory walked.
+
+        Meant for the library scan, which then walks the tree for both.
+        Call start first, so no change during the scan is missed.
+
+        :return: Generator of absolute image paths
+        :rtype: generator
+        """
+
+        for path in hf.iter_img_paths(self.path, recursive=self.recursive,
+                                      include=self.include,
+                                      exclude=self.exclude,
+                                      on_directory=self._watch):
+            directory, name = os.path.split(self._relative(path))
+            with self._lock:
+                self._known.setdefault(directory, set()).add(name)
+            yield path
+
+    def _relative(self, path):
+        return path[len(os.path.join(self.path, '')):]
+
+    def _watch(self, path):
+        with self._lock:
+            self._add_dir(self._relative(path))
+
+    def _is_member(self, rel):
+        return hf.is_library_member(rel, self.recursive, self.include,
+                                    self.exclude, sep=os.sep)
+
+    def _add_dir(self, rel):
+        """Watches a directory, or starts polling it.
+
+        :return: Whether the directory was not watched before, also under
+                 another path, e.g. through a symlink
+        """
+
+        path = os.path.join(self.path, rel)
+        if self._fd >= 0:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path),
+                                              IN_WATCHED)
+            if wd < 0 or wd in self._watches:
+                return False
+            self._watches[wd] = rel
+            return True
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if (st.st_dev, st.st_ino) in self._inodes:
+            return False
+        self._inodes[st.st_dev, st.st_ino] = rel
+        self._dirs[rel] = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        return True
+
+    def _add_tree(self, rel):
+        """Watches a new directory and the ones below it, and reports the
+        images within.
+        """
+
+        if not hf.is_library_dir(rel, self.recursive, self.exclude,
+                                 sep=os.sep):
+            return
+        # Watched before listing it, so no image slips through
+        if not self._add_dir(rel):
+            return
+        names = set()
+        subdirs = []
+        try:
+            with os.scandir(os.path.join(self.path, rel)) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    elif self._is_member(os.path.join(rel, entry.name)):
+                        names.add(entry.name)
+        except OSError:
+            pass
+        self._added(rel, names)
+        for name in subdirs:
+            self._add_tree(os.path.join(rel, name))
+
+    def _forget_tree(self, rel):
+        """Stops watching a directory that was removed or moved away and the
+        ones below it, and reports the images within as removed.
+        """
+
+        prefix = os.path.join(rel, '')
+
+        def below(directory):
+            return directory == rel or directory.startswith(prefix)
+
+        for wd in [wd for wd, d in self._watches.items() if below(d)]:
+            # Also drops a watch that followed the directory to its new name
+            del self._watches[wd]
+            self._libc.inotify_rm_watch(self._fd, wd)
+        for directory in [d for d in self._dirs if below(d)]:
+            del self._inodes[self._dirs.pop(directory)[:2]]
+        for directory in sorted(d for d in self._known if below(d)):
+            self._removed(directory, set(self._known[directory]))
+
+    def _added(self, directory, names):
+        known = self._known.setdefault(directory, set())
+        for name in sorted(names - known):
+            known.add(name)
+            self.on_added(os.path.join(self.path, directory, name))
+
+    def _removed(self, directory, names):
+        known = self._known.get(directory, set())
+        for name in sorted(names & known):
+            known.discard(name)
+            self.on_removed(os.path.join(self.path, directory, name))
+        if not known:
+            self._known.pop(directory, None)
+
+    def _watch_inotify(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._fd, self._wake[0]], [], [])
+            if self._wake[0] in readable:
+                return
+
+            data = os.read(self._fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                with self._lock:
+                    if not self._handle(wd, mask, os.fsdecode(name)):
+                        return
+
+    def _handle(self, wd, mask, name):
+        """Reacts to an inotify event.
+
+        :return: Whether to keep watching
+        """
+
+        if mask & IN_Q_OVERFLOW:
+            # Events were lost, so catch up by comparing listings
+            print("Too many changes in {}. Listing it again."
+                  .format(self.path))
+            self._compare()
+            return True
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return True
+        directory = self._watches.get(wd)
+        if directory is None:
+            return True
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if directory == '':
+                print("{} was removed. Stopped watching it."
+                      .format(self.path))
+                return False
+            return True
+
+        rel = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(rel)
+            elif mask & IN_REMOVED:
+                self._forget_tree(rel)
+        elif mask & IN_ADDED:
+            if self._is_member(rel):
+                self._added(directory, {name})
+        elif mask & IN_REMOVED:
+            self._removed(directory, {name})
+        return True
+
+    def _compare(self):
+        """Lists the tree again and reports the differences.
+        """
+
+        current = {}
+        for path in hf.iter_img_paths(
+                self.path, recursive=self.recursive, include=self.include,
+                exclude=self.exclude,
+                on_directory=lambda p: self._add_dir(self._relative(p))):
+            directory, name = os.path.split(self._relative(path))
+            current.setdefault(directory, set()).add(name)
+        for directory in sorted(set(self._known) | set(current)):
+            names = current.get(directory, set())
+            self._added(directory, names)
+            self._removed(directory, self._known.get(directory, set()) - names)
+
+    def _watch_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            with self._lock:
+                # Parents first, so moved directories are found at once
+                for rel in sorted(self._dirs):
+                    if rel in self._dirs:
+                        self._poll(rel)
+
+    def _poll(self, rel):
+        """Lists a directory again if its modification time changed.
+        """
+
+        dev, ino, mtime = self._dirs[rel]
+        path = os.path.join(self.path, rel)
+        try:
+            st = os.stat(path)
+        except OSError:
+            if rel:
+                self._forget_tree(rel)
+            return
+        if (st.st_dev, st.st_ino) != (dev, ino):
+            # Another directory took its name
+            self._forget_tree(rel)
+            self._add_tree(rel)
+            return
+        if st.st_mtime_ns == mtime:
+            return
+
+        self._dirs[rel] = (dev, ino, st.st_mtime_ns)
+        names = set()
+        subdirs = set()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    sub = os.path.join(rel, entry.name)
+                    if entry.is_dir():
+                        subdirs.add(sub)
+                    elif self._is_member(sub):
+                        names.add(entry.name)
+        except OSError:
+            return
+        # Directories moved away first, so they can be found under their
+        # new name
+        for sub in [d for d in self._dirs
+                    if d and d != rel and os.path.dirname(d) == rel
+                    and d not in subdirs]:
+            self._forget_tree(sub)
+        for sub in sorted(subdirs):
+            if sub not in self._dirs:
+                self._add_tree(sub)
+        self._added(rel, names)
+        self._removed(rel, self._known.get(rel, set()) - names)